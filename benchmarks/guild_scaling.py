@@ -0,0 +1,78 @@
+"""
+Measures star throughput as more guilds react at once, each reaction promotes a message through a slow API
+
+    python benchmarks/guild_scaling.py --guilds 1 2 4 8 16 --latency 0.05 --output scaling.json
+"""
+import asyncio
+import time
+from typing import Dict, List
+
+import harness
+from harness import StubBot, StubChannel, StubGuild, StubMember, StubMessage, starboard
+
+
+async def run(guild_count: int, reactions: int, latency: float) -> Dict:
+    # every star promotes its message, so every reaction waits on a send and an add_reaction
+    starboard.MIN_STARS = 1
+    starboard.REQUIREMENTS_UP_MULTIPLIER = 1
+    ids = harness.snowflakes()
+    bot = StubBot(max_messages=guild_count * reactions)
+    guilds = [StubGuild(1 + i) for i in range(guild_count)]
+    starboard_channels = [bot.add_channel(StubChannel(1000 + i, guild, ids, latency)) for i, guild in enumerate(guilds)]
+    channels = [bot.add_channel(StubChannel(2000 + i, guild)) for i, guild in enumerate(guilds)]
+    await harness.connect(bot)
+    await starboard.database.migrate(bot, 'starboard', starboard.MIGRATIONS)
+    await bot.database.executemany(
+        "INSERT INTO starboard_channels (channel_id) VALUES (?)",
+        ((channel.id,) for channel in starboard_channels)
+    )
+    await bot.database.commit()
+    cog = await harness.load_cog(bot)
+    try:
+        work = []
+        for guild, channel in zip(guilds, channels):
+            author = StubMember(1, guild)
+            giver = StubMember(2, guild)
+            messages = [StubMessage(next(ids), channel, author, f"message {i}") for i in range(reactions)]
+            for message in messages:
+                cog.index_message(message)
+            work.append((channel, giver, messages))
+
+        durations: List[float] = []
+
+        async def react(channel: StubChannel, giver: StubMember, messages: List[StubMessage]):
+            # reactions within a guild arrive one after another, guilds are independent of each other
+            for message in messages:
+                start = time.perf_counter()
+                await cog.on_star_reaction(channel.id, message.id, giver, True)
+                durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(react(*args) for args in work))
+        elapsed = time.perf_counter() - start
+        promoted = sum(channel.sent for channel in starboard_channels)
+        assert promoted == guild_count * reactions, f"only {promoted} messages were promoted"
+    finally:
+        await harness.unload_cog(cog)
+        await bot.database.close()
+    return {'guilds': guild_count, 'latency_ms': latency * 1000, **harness.summarize(durations, elapsed)}
+
+
+async def main():
+    arg_parser = harness.parser(__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--guilds', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    arg_parser.add_argument('--reactions', type=int, default=20, help="reactions per guild")
+    arg_parser.add_argument('--latency', type=float, default=0.05, help="seconds each simulated API call takes")
+    args = arg_parser.parse_args()
+    results = []
+    for guild_count in args.guilds:
+        result = await run(guild_count, args.reactions, args.latency)
+        # close to guild_count when guilds don't wait on each other, close to 1 when they do
+        baseline = results[0] if results else result
+        result['speedup'] = result['ops_per_second'] / baseline['ops_per_second']
+        results.append(result)
+    harness.report('guild_scaling', results, args.output)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+"""
+Drives StarboardCog offline, against an in-memory database and stand-ins for the Discord objects it touches
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import types
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiosqlite
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import starboard  # noqa: E402
+
+
+class StubRole:
+    def __init__(self, guild: 'StubGuild'):
+        self.id = guild.id
+        self.guild = guild
+
+
+class StubGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.default_role = StubRole(self)
+        self.text_channels: List['StubChannel'] = []  # nothing for reconcile to walk
+        self.me = None
+
+
+class StubMember:
+    def __init__(self, member_id: int, guild: StubGuild, bot: bool = False):
+        self.id = member_id
+        self.guild = guild
+        self.bot = bot
+        self.display_name = f"member {member_id}"
+        avatar_url = f"https://cdn.discordapp.com/embed/avatars/{member_id % 5}.png"
+        self.display_avatar = types.SimpleNamespace(url=avatar_url)
+
+
+class StubChannel:
+    """
+    A text channel whose API calls cost `latency` seconds and succeed, messages sent to it get snowflakes from `ids`
+    """
+    type = discord.ChannelType.text
+    _state = None
+
+    def __init__(self, channel_id: int, guild: StubGuild, ids: Iterable[int] = (), latency: float = 0.0):
+        self.id = channel_id
+        self.guild = guild
+        self.ids = iter(ids)
+        self.latency = latency
+        self.sent = 0
+
+    def permissions_for(self, _) -> discord.Permissions:
+        return discord.Permissions.all()
+
+    def is_nsfw(self) -> bool:
+        return False
+
+    async def send(self, **_) -> 'StubMessage':
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return StubMessage(next(self.ids), self, StubMember(0, self.guild, bot=True), "")
+
+    async def fetch_message(self, message_id: int):
+        raise discord.NotFound(types.SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+
+
+class StubMessage:
+    # small enough that a million of them fit in memory next to the index
+    __slots__ = ('id', 'channel', 'guild', 'author', 'content')
+    attachments = ()
+    stickers = ()
+    reference = None
+
+    def __init__(self, message_id: int, channel: StubChannel, author: StubMember, content: str):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.guild.id}/{self.channel.id}/{self.id}"
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        return discord.utils.snowflake_time(self.id)
+
+    async def add_reaction(self, _):
+        await asyncio.sleep(self.channel.latency)
+
+
+class StubBot:
+    """
+    Just the parts of `Isabel` the starboard uses, `add_cog` keeps the cog instead of registering it
+    """
+
+    def __init__(self, max_messages: int):
+        self.logger = logging.getLogger('benchmarks')
+        self.config: Dict = {}
+        self.database: Optional[aiosqlite.Connection] = None
+        self.database_lock = asyncio.Lock()
+        self.cached_messages: List[StubMessage] = []
+        self.http = types.SimpleNamespace(user_agent=f"DiscordBot discord.py/{discord.__version__}")
+        self._connection = types.SimpleNamespace(max_messages=max_messages)
+        self.channels: Dict[int, StubChannel] = {}
+        self.guilds: Dict[int, StubGuild] = {}
+        self.cog: Optional[starboard.StarboardCog] = None
+
+    def get_channel(self, channel_id: int) -> Optional[StubChannel]:
+        return self.channels.get(channel_id)
+
+    def get_guild(self, guild_id: int) -> Optional[StubGuild]:
+        return self.guilds.get(guild_id)
+
+    async def add_cog(self, cog: starboard.StarboardCog):
+        self.cog = cog
+
+    def add_channel(self, channel: StubChannel) -> StubChannel:
+        self.channels[channel.id] = channel
+        self.guilds[channel.guild.id] = channel.guild
+        return channel
+
+
+def snowflakes(start: Optional[int] = None) -> Iterable[int]:
+    """
+    Endless fresh snowflakes starting now, recent enough for every age check in the starboard
+    """
+    snowflake = start or discord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+    while True:
+        yield snowflake
+        snowflake += 1
+
+
+async def connect(bot: StubBot):
+    bot.database = await aiosqlite.connect(':memory:')
+    await bot.database.execute(
+        "CREATE TABLE IF NOT EXISTS schema_versions (component TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    await bot.database.commit()
+
+
+async def load_cog(bot: StubBot) -> starboard.StarboardCog:
+    """
+    Runs the extension's own setup, the database must already hold whatever the cog should start with
+    """
+    await starboard.setup(bot)
+    return bot.cog
+
+
+async def unload_cog(cog: starboard.StarboardCog):
+    """
+    Stops the cog's background work, pending starboard edits are dropped since sending them would need the API
+    """
+    cog.hourly.cancel()
+    cog.reconcile_task.cancel()
+    for task in (*cog.prefetches.values(), *cog.edit_coalescer.timers.values()):
+        task.cancel()
+    await cog.star_givers_writer.close()
+    await cog.session.close()
+    await asyncio.sleep(0)  # let the cancelled tasks finish before the database goes away
+
+
+def summarize(durations: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    :param durations: how long each call took
+    :param elapsed: wall-clock time of the whole run, so throughput includes everything between the calls too
+    """
+    ordered = sorted(durations)
+    return {
+        'calls': len(ordered),
+        'ops_per_second': len(ordered) / elapsed,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] * 1000,
+    }
+
+
+async def measure(call: Callable[[int], Awaitable], calls: int) -> Dict[str, float]:
+    """
+    Awaits `call(i)` for i in range(calls), one after another
+    """
+    durations = []
+    start = time.perf_counter()
+    for i in range(calls):
+        call_start = time.perf_counter()
+        await call(i)
+        durations.append(time.perf_counter() - call_start)
+    return summarize(durations, time.perf_counter() - start)
+
+
+def commit_hash() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parser(description: str) -> argparse.ArgumentParser:
+    rv = argparse.ArgumentParser(description=description)
+    rv.add_argument('--output', help="also write the JSON results to this file")
+    return rv
+
+
+def report(benchmark: str, results: List[Dict], output: Optional[str] = None):
+    """
+    Prints the results as JSON, keyed by commit so runs on different commits can be compared directly
+    """
+    document = {
+        'benchmark': benchmark,
+        'commit': commit_hash(),
+        'python': platform.python_version(),
+        'discord.py': discord.__version__,
+        'timestamp': time.time(),
+        'results': results,
+    }
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
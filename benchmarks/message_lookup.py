@@ -0,0 +1,64 @@
+"""
+Times StarboardCog.get_message against message indexes of growing size, the cost should not grow with them
+
+    python benchmarks/message_lookup.py --sizes 1000 10000 100000 1000000 --output lookup.json
+"""
+import asyncio
+import random
+from typing import Dict, List
+
+import harness
+from harness import StubBot, StubChannel, StubGuild, StubMember, StubMessage, starboard
+
+CHANNEL_COUNT = 100
+
+
+async def run(index_size: int, calls: int) -> List[Dict]:
+    ids = harness.snowflakes()
+    bot = StubBot(max_messages=index_size)
+    # no starboard in this guild, so indexing doesn't take snapshots and only the index itself is measured
+    guild = StubGuild(1)
+    channels = [bot.add_channel(StubChannel(100 + i, guild)) for i in range(CHANNEL_COUNT)]
+    author = StubMember(1, guild)
+    await harness.connect(bot)
+    cog = await harness.load_cog(bot)
+    try:
+        messages = [StubMessage(next(ids), channels[i % CHANNEL_COUNT], author, "") for i in range(index_size)]
+        for message in messages:
+            cog.index_message(message)
+
+        rng = random.Random(0)
+        hits = [rng.choice(messages) for _ in range(calls)]
+        misses = [StubMessage(next(ids), rng.choice(channels), author, "") for _ in range(calls)]
+
+        async def index_message(i: int):
+            cog.index_message(misses[i])  # the index is full, so each one evicts the oldest entry
+
+        paths = {
+            'get_message hit': lambda i: cog.get_message(hits[i].channel.id, hits[i].id),
+            'get_message miss': lambda i: cog.get_message(misses[i].channel.id, misses[i].id, use_api=False),
+            'index_message': index_message,
+        }
+        results = []
+        for path, call in paths.items():
+            results.append({'index_size': index_size, 'path': path, **await harness.measure(call, calls)})
+        assert len(cog.message_index) == index_size
+    finally:
+        await harness.unload_cog(cog)
+        await bot.database.close()
+    return results
+
+
+async def main():
+    arg_parser = harness.parser(__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    arg_parser.add_argument('--calls', type=int, default=100000, help="lookups per path and size")
+    args = arg_parser.parse_args()
+    results = []
+    for index_size in args.sizes:
+        results.extend(await run(index_size, args.calls))
+    harness.report('message_lookup', results, args.output)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
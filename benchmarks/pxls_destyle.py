@@ -0,0 +1,110 @@
+"""
+Compares the NumPy template de-styling with the numba per-pixel loop it replaced, on small and very large templates
+
+    python benchmarks/pxls_destyle.py --output destyle.json
+
+numba isn't a dependency anymore, install it to get both sides, without it only the NumPy side is measured
+"""
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import harness
+from extensions import pxls_embed
+
+try:
+    from numba import jit
+except ImportError:
+    jit = None
+
+# (name, target height, target width, tile width, runs)
+TEMPLATES = [
+    ('small', 100, 100, 5, 50),
+    ('medium', 500, 500, 5, 10),
+    ('very large', 2000, 2000, 3, 3),
+]
+
+
+def remove_style_loop(array, target_height, target_width, tile_width):
+    # what fast_remove_style was before it was vectorized
+    result = np.zeros((target_height, target_width, 4), dtype=np.uint8)
+
+    for y in range(target_height):
+        for x in range(target_width):
+            for j in range(tile_width):
+                for i in range(tile_width):
+                    py = y * tile_width + j
+                    px = x * tile_width + i
+                    alpha = array[py, px, 3]
+                    if alpha > 128:
+                        result[y, x] = array[py, px]
+                        result[y, x, 3] = 255
+                        break
+                else:
+                    continue  # inner loop was *not* broken, continue the outer loop
+                break  # inner loop was broken, break the outer loop too
+
+    return result
+
+
+def styled_template(target_height: int, target_width: int, tile_width: int) -> np.ndarray:
+    """
+    One opaque dot per tile somewhere inside it like a pxls style, with a tenth of the tiles left empty
+    """
+    rng = np.random.default_rng(0)
+    styled = np.zeros((target_height * tile_width, target_width * tile_width, 4), dtype=np.uint8)
+    offsets = rng.integers(0, tile_width, (2, target_height, target_width))
+    filled = rng.random((target_height, target_width)) > 0.1
+    rows = (np.arange(target_height)[:, None] * tile_width + offsets[0])[filled]
+    columns = (np.arange(target_width)[None, :] * tile_width + offsets[1])[filled]
+    styled[rows, columns, :3] = rng.integers(0, 256, (len(rows), 3), dtype=np.uint8)
+    styled[rows, columns, 3] = 255
+    return styled
+
+
+def time_runs(func: Callable, styled: np.ndarray, args, runs: int) -> Dict[str, float]:
+    durations = []
+    start = time.perf_counter()
+    for _ in range(runs):
+        run_start = time.perf_counter()
+        func(styled, *args)
+        durations.append(time.perf_counter() - run_start)
+    return harness.summarize(durations, time.perf_counter() - start)
+
+
+def main():
+    args = harness.parser(__doc__.strip().splitlines()[0]).parse_args()
+    implementations = {'numpy': pxls_embed.fast_remove_style}
+    results: List[Dict] = []
+    if jit is not None:
+        numba_remove_style = jit(nopython=True)(remove_style_loop)
+        warmup = styled_template(1, 1, 1)
+        start = time.perf_counter()
+        numba_remove_style(warmup, 1, 1, 1)
+        # what the first pxls link after a start used to pay with a cold cache
+        compile_seconds = time.perf_counter() - start
+        results.append({
+            'template': 'first call',
+            'implementation': 'numba',
+            **harness.summarize([compile_seconds], compile_seconds),
+        })
+        implementations['numba'] = numba_remove_style
+    for name, target_height, target_width, tile_width, runs in TEMPLATES:
+        styled = styled_template(target_height, target_width, tile_width)
+        outputs = []
+        for implementation, func in implementations.items():
+            outputs.append(func(styled, target_height, target_width, tile_width))
+            results.append({
+                'template': name,
+                'shape': list(styled.shape),
+                'tile_width': tile_width,
+                'implementation': implementation,
+                **time_runs(func, styled, (target_height, target_width, tile_width), runs),
+            })
+        assert all(np.array_equal(outputs[0], output) for output in outputs), f"outputs differ on {name}"
+    harness.report('pxls_destyle', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Times the starboard's hot paths with the caches filled to several sizes
+
+    python benchmarks/starboard_paths.py --sizes 1000 10000 100000 --output paths.json
+"""
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+import harness
+from harness import StubBot, StubChannel, StubGuild, StubMember, StubMessage, starboard
+
+STARBOARD_CHANNEL_ID = 10
+CHANNEL_ID = 11
+
+
+async def run(cache_size: int, calls: int) -> List[Dict]:
+    starboard.STAR_CACHE_SIZE = cache_size
+    starboard.SNAPSHOT_CACHE_SIZE = cache_size
+    ids = harness.snowflakes()
+    bot = StubBot(max_messages=cache_size)
+    guild = StubGuild(1)
+    starboard_channel = bot.add_channel(StubChannel(STARBOARD_CHANNEL_ID, guild, ids))
+    channel = bot.add_channel(StubChannel(CHANNEL_ID, guild))
+    await harness.connect(bot)
+    await starboard.database.migrate(bot, 'starboard', starboard.MIGRATIONS)
+    await bot.database.execute("INSERT INTO starboard_channels (channel_id) VALUES (?)", (starboard_channel.id,))
+    # a starboard as old as the caches are big, setup loads all of its references
+    await bot.database.executemany(
+        "INSERT INTO starboard_reference "
+        "(starboard_message_id, starboard_channel_id, original_message_id, original_channel_id) VALUES (?, ?, ?, ?)",
+        ((next(ids), starboard_channel.id, next(ids), channel.id) for _ in range(cache_size))
+    )
+    await bot.database.commit()
+
+    setup_start = time.perf_counter()
+    cog = await harness.load_cog(bot)
+    setup_seconds = time.perf_counter() - setup_start
+    results = [{'cache_size': cache_size, 'path': 'setup', **harness.summarize([setup_seconds], setup_seconds)}]
+    try:
+        # nothing gets promoted, promoting is the API's cost and not ours
+        cog.current_requirements[guild] = 1 << 62
+        messages = [
+            StubMessage(next(ids), channel, StubMember(i % 1000 + 1, guild), f"message {i} https://example.com/{i}.png")
+            for i in range(cache_size)
+        ]
+        for message in messages:
+            cog.index_message(message)
+            key = (channel.id, message.id)
+            cog.star_cache[key] = starboard.StarredMessage()
+            cog.star_cache_expiry.add(key)
+
+        rng = random.Random(0)
+        picks = [rng.choice(messages) for _ in range(calls)]
+        givers = [StubMember(1_000_000 + i, guild) for i in range(calls)]
+        paths = {
+            'get_message': lambda i: cog.get_message(channel.id, picks[i].id),
+            'make_starboard_message_kwargs': lambda i: cog.make_starboard_message_kwargs(picks[i], 5),
+            'star_amount_changed': lambda i: cog.star_amount_changed(picks[i]),
+            'on_star_reaction': lambda i: cog.on_star_reaction(channel.id, picks[i].id, givers[i], True),
+        }
+        for path, call in paths.items():
+            results.append({'cache_size': cache_size, 'path': path, **await harness.measure(call, calls)})
+    finally:
+        await harness.unload_cog(cog)
+        await bot.database.close()
+    return results
+
+
+async def main():
+    arg_parser = harness.parser(__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--calls', type=int, default=10000, help="calls per path and size")
+    args = arg_parser.parse_args()
+    results = []
+    for cache_size in args.sizes:
+        results.extend(await run(cache_size, args.calls))
+    harness.report('starboard_paths', results, args.output)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
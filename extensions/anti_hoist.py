@@ -5,6 +5,8 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from extensions import database
+
 if TYPE_CHECKING:
     from main import Isabel
 
@@ -49,7 +51,7 @@ class AntiHoistCog(commands.Cog):
     async def add_guild(self, guild: discord.Guild):
         if guild not in self.guilds:
             self.guilds.append(guild)
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("INSERT OR IGNORE INTO hoist_guilds (guild_id) VALUES (?)", (guild.id,))
             return True
         return False
@@ -57,7 +59,7 @@ class AntiHoistCog(commands.Cog):
     async def remove_guild(self, guild: discord.Guild):
         if guild in self.guilds:
             self.guilds.remove(guild)
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("DELETE FROM hoist_guilds WHERE guild_id = ?", (guild.id,))
             return True
         return False
@@ -84,16 +86,24 @@ class AntiHoistCog(commands.Cog):
                 )
 
 
+MIGRATIONS = (
+    (
+        # lookups by guild_id use the UNIQUE index
+        """
+        CREATE TABLE IF NOT EXISTS hoist_guilds (
+            guild_id INTEGER UNIQUE
+        )
+        """,
+    ),
+)
+
+
 async def setup(bot: 'Isabel'):
     while not bot.database:
         await asyncio.sleep(0)
+    await database.migrate(bot, 'anti_hoist', MIGRATIONS)
     guilds = []
     async with bot.database.cursor() as cursor:
-        await cursor.execute("""
-        CREATE TABLE IF NOT EXISTS hoist_guilds (
-            guild_id INTEGER UNIQUE
-        )
-        """)
         await cursor.execute("SELECT * FROM hoist_guilds")
         rows = await cursor.fetchall()
         guilds.extend(bot.get_guild(row[0]) for row in rows)
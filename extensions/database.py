@@ -1,4 +1,5 @@
-from typing import TYPE_CHECKING
+import contextlib
+from typing import TYPE_CHECKING, AsyncIterator, Sequence
 
 import aiosqlite
 
@@ -6,13 +7,68 @@ if TYPE_CHECKING:
     from main import Isabel
 
 
-async def setup(bot: 'Isabel'):
-    bot.database = await aiosqlite.connect('isabel.db')
+async def migrate(bot: 'Isabel', component: str, migrations: Sequence[Sequence[str]]):
+    """
+    Brings the tables owned by `component` up to date
+    :param bot: the bot, its database must already be connected
+    :param component: name the versions are stored under, usually the extension name
+    :param migrations: `migrations[n]` holds the statements that upgrade the component to version n + 1,
+        only ever append to this, never edit or reorder migrations that have already shipped
+    """
+    db = bot.database
+    async with db.execute("SELECT version FROM schema_versions WHERE component = ?", (component,)) as cursor:
+        row = await cursor.fetchone()
+    current_version = row[0] if row else 0
+    for version, statements in enumerate(migrations[current_version:], start=current_version + 1):
+        bot.logger.info(f"Migrating {component} to version {version}")
+        async with transaction(bot):
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute(
+                "INSERT OR REPLACE INTO schema_versions (component, version) VALUES (?, ?)",
+                (component, version)
+            )
 
 
-async def teardown(bot: 'Isabel'):
-    db = bot.database
-    bot.database = None
+@contextlib.asynccontextmanager
+async def transaction(bot: 'Isabel') -> AsyncIterator[aiosqlite.Connection]:
+    """
+    Commits the writes made in the block as one transaction, or undoes just those writes if the block raises.
+    Every extension shares the one connection, so all writes go through here and take turns,
+    otherwise one extension's commit or rollback could land in the middle of another's writes
+    :param bot: the bot, `bot.database_lock` is held for the whole block
+    :return: the connection to write with
+    """
+    async with bot.database_lock:
+        db = bot.database
+        await db.execute("SAVEPOINT isabel_write")
+        try:
+            yield db
+        except BaseException:
+            # sqlite rolls back the whole transaction itself on some errors, then there's no savepoint left
+            with contextlib.suppress(aiosqlite.OperationalError):
+                await db.execute("ROLLBACK TO isabel_write")
+                await db.execute("RELEASE isabel_write")
+            raise
+        await db.execute("RELEASE isabel_write")
+        await db.commit()
+
+
+async def setup(bot: 'Isabel'):
+    db = await aiosqlite.connect('isabel.db')
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS schema_versions (
+        component TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """)
     await db.commit()
-    await db.close()
+    bot.database = db
 
+
+async def teardown(bot: 'Isabel'):
+    async with bot.database_lock:  # let a write that already started finish
+        db = bot.database
+        bot.database = None
+        await db.commit()
+        await db.close()
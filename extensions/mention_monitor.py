@@ -5,6 +5,8 @@ import discord
 from discord import Guild, TextChannel, app_commands
 from discord.ext import commands
 
+from extensions import database
+
 if TYPE_CHECKING:
     from main import Isabel
 
@@ -31,7 +33,7 @@ class MentionMonitorCog(commands.Cog):
         guild = channel.guild
         if channel not in self.guilds.setdefault(guild, []):
             self.guilds.setdefault(guild, []).append(channel)
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("INSERT OR IGNORE INTO monitor_channels (channel_id) VALUES (?)", (channel.id,))
             return True
         return False
@@ -40,7 +42,7 @@ class MentionMonitorCog(commands.Cog):
         guild = channel.guild
         if channel in self.guilds.setdefault(guild, []):
             self.guilds.setdefault(guild, []).remove(channel)
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("DELETE FROM monitor_channels WHERE channel_id = ?", (channel.id,))
             return True
         return False
@@ -66,16 +68,24 @@ class MentionMonitorCog(commands.Cog):
                 )
 
 
+MIGRATIONS = (
+    (
+        # lookups by channel_id use the UNIQUE index
+        """
+        CREATE TABLE IF NOT EXISTS monitor_channels (
+            channel_id INTEGER UNIQUE
+        )
+        """,
+    ),
+)
+
+
 async def setup(bot: 'Isabel'):
     while not bot.database:
         await asyncio.sleep(0)
+    await database.migrate(bot, 'mention_monitor', MIGRATIONS)
     channel_dict = {}
     async with bot.database.cursor() as cursor:
-        await cursor.execute("""
-        CREATE TABLE IF NOT EXISTS monitor_channels (
-            channel_id INTEGER UNIQUE
-        )
-        """)
         await cursor.execute("SELECT * FROM monitor_channels")
         rows = await cursor.fetchall()
         for row in rows:
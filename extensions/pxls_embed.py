@@ -1,9 +1,19 @@
 import asyncio
+import contextlib
+import hashlib
 import io
 import logging
+import multiprocessing
+import os
 import re
+import struct
+import tempfile
+import time
 import urllib.parse
-from typing import TYPE_CHECKING, Iterable, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
 
 import aiohttp
 import discord
@@ -11,7 +21,8 @@ import numpy as np
 from PIL import Image
 from discord import app_commands
 from discord.ext import commands
-from numba import jit
+
+from extensions import database
 
 if TYPE_CHECKING:
     from main import Isabel
@@ -19,42 +30,382 @@ if TYPE_CHECKING:
 PXLS_REGEX = re.compile(r"(?:https?://)?((?:www\.)?pxls\.space|(?:[a-z0-9\-]+\.)?pxls\.world)/#\S+")
 IMAGE_TIMEOUT = aiohttp.ClientTimeout(total=60)
 LEGAL_CHARACTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
+TEMPLATE_CACHE_DIR = 'pxls_template_cache'
+TEMPLATE_CACHE_BYTES = 256 * 1024 * 1024
+TEMPLATE_MAX_BYTES = 16 * 1024 * 1024  # downloads are cut off past this
+TEMPLATE_MAX_PIXELS = 64 * 1024 * 1024  # templates bigger than this once decoded are never decoded
+TEMPLATE_CHUNK_BYTES = 64 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+RENDER_CACHE_ENTRY_BYTES = 128  # charged per entry on top of the PNG, so "not styled" markers aren't free
+NOT_STYLED = b''  # cached in place of a PNG for templates that render_no_style leaves alone
+RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+RENDER_MAX_PENDING = 16  # renders queued or running at once, templates over this keep the plain embed
+RENDER_STRIP_BYTES = 32 * 1024 * 1024  # RGBA bytes converted and de-styled at once, bigger templates go in strips
+# big templates are decoded into a memory-mapped file here instead of private memory, None keeps them in memory
+RENDER_SCRATCH_DIR: Optional[str] = tempfile.gettempdir()
 
 
 def remove_illegal_characters(text: str) -> str:
     return ''.join(c if c in LEGAL_CHARACTERS else '_' for c in text)
 
 
-@jit(nopython=True, cache=True)
+class TemplateRejected(Exception):
+    pass
+
+
+def png_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Reads width and height from the IHDR chunk, which the PNG spec requires to come first
+    :param head: at least the first 24 bytes of the file
+    :return: the dimensions, or None if this isn't a PNG
+    """
+    if len(head) < 24 or not head.startswith(PNG_SIGNATURE) or head[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', head[16:24])
+
+
+async def read_capped(resp: aiohttp.ClientResponse, max_bytes: int, max_pixels: int) -> bytes:
+    """
+    Reads a template response, giving up as soon as it's clear the template is too big
+    :raise TemplateRejected: if the body is over `max_bytes` or the PNG is over `max_pixels`
+    """
+    if resp.content_length is not None and resp.content_length > max_bytes:
+        raise TemplateRejected(f"{resp.url} is {resp.content_length} bytes")
+    data = bytearray()
+    checked_dimensions = False
+    async for chunk in resp.content.iter_chunked(TEMPLATE_CHUNK_BYTES):
+        data += chunk
+        if len(data) > max_bytes:
+            raise TemplateRejected(f"{resp.url} is over {max_bytes} bytes")
+        if not checked_dimensions and len(data) >= 24:
+            checked_dimensions = True
+            dimensions = png_dimensions(bytes(data[:24]))
+            if dimensions is not None and dimensions[0] * dimensions[1] > max_pixels:
+                raise TemplateRejected(f"{resp.url} is {dimensions[0]}x{dimensions[1]}")
+    return bytes(data)
+
+
 def fast_remove_style(array, target_height, target_width, tile_width):
     #  pxlsspace/Clueless/blob/354b8eb92ad87517d9f488e1d655535de468c8bf/src/utils/pxls/template_manager.py#L812
     #  MIT License https://github.com/pxlsspace/Clueless/blob/354b8eb92ad87517d9f488e1d655535de468c8bf/LICENSE
+    # every output pixel is the first (row by row) sub-pixel of its tile with alpha > 128, made fully opaque
+    # or transparent black if the tile has no such sub-pixel
+    blocks = array[:target_height * tile_width, :target_width * tile_width].reshape(
+        target_height, tile_width, target_width, tile_width, 4
+    )
+    opaque = (blocks[..., 3] > 128).transpose(0, 2, 1, 3).reshape(target_height, target_width, tile_width ** 2)
+    first = opaque.argmax(axis=2)
+    rows, columns = np.ogrid[:target_height, :target_width]
+    result = blocks[rows, first // tile_width, columns, first % tile_width]
+    result[..., 3] = 255
+    result[~opaque[rows, columns, first]] = 0
+    return result
+
+
+def load_into_scratch(img: Image.Image, scratch_dir: str) -> Optional[np.memmap]:
+    """
+    Decodes `img` into a memory-mapped file instead of memory, so the OS can page it out
+    :return: the mapping that has to stay alive as long as `img`, or None if the mode can't be mapped
+    """
+    bands = {'L': 1, 'P': 1, 'LA': 4, 'RGBA': 4}.get(img.mode)
+    if bands is None:
+        return None  # PIL stores these with padding or bit packing it can't map
+    with tempfile.TemporaryFile(dir=scratch_dir) as file:
+        scratch = np.memmap(file, dtype=np.uint8, mode='w+', shape=(img.height * img.width * bands,))
+    # noinspection PyUnresolvedReferences
+    img.im = Image.core.map_buffer(scratch, img.size, 'raw', 0, (img.mode, 0, 1))
+    img.load()
+    return scratch
+
+
+def remove_style_in_strips(
+        img: Image.Image,
+        target_height: int,
+        target_width: int,
+        tile_width: int,
+        strip_bytes: int
+) -> np.ndarray:
+    """
+    Same as `fast_remove_style(np.array(img.convert('RGBA')), ...)`,
+    but only ever converts as many rows of tiles at once as fit in `strip_bytes`
+    """
     result = np.zeros((target_height, target_width, 4), dtype=np.uint8)
+    strip_rows = max(1, strip_bytes // (img.width * 4 * tile_width))
+    for top in range(0, target_height, strip_rows):
+        bottom = min(top + strip_rows, target_height)
+        strip = np.asarray(img.crop((0, top * tile_width, img.width, bottom * tile_width)).convert('RGBA'))
+        result[top:bottom] = fast_remove_style(strip, bottom - top, target_width, tile_width)
+    return result
+
+
+def render_no_style(
+        data: bytes,
+        target_width: int,
+        strip_bytes: int = RENDER_STRIP_BYTES,
+        scratch_dir: Optional[str] = RENDER_SCRATCH_DIR
+) -> Optional[bytes]:
+    """
+    Turns a styled template into a plain PNG with one pixel per template pixel, upscaled for discord
+    :param data: the styled template as downloaded
+    :param target_width: the template width in template pixels, the `tw` of the link
+    :param strip_bytes: templates bigger than this in RGBA are de-styled in strips of at most this size
+    :param scratch_dir: where to memory-map templates that are de-styled in strips, None to keep them in memory.
+        Mapped, the decoded template is file-backed and the OS can page it out, so the private memory of a render
+        stays around two strips plus the output. In memory, or for modes `load_into_scratch` can't map,
+        the decoded template comes on top of that, up to 4 * TEMPLATE_MAX_PIXELS bytes
+    :return: the PNG, or None if the template isn't styled
+    """
+    img = Image.open(io.BytesIO(data))
+    width, _ = img.size
+    if target_width == width or img.width * img.height > TEMPLATE_MAX_PIXELS:
+        return None  # the size is known from the header alone, nothing was decoded yet
+    tile_width = int(width / target_width)
+    target_height = int(img.height / tile_width)
+    if img.width * img.height * 4 <= strip_bytes:
+        img_arr = np.array(img.convert('RGBA'))
+        no_style_arr = fast_remove_style(img_arr, target_height, target_width, tile_width)
+    else:
+        # PNGs can't be decoded in parts, but everything after decoding can be
+        scratch = load_into_scratch(img, scratch_dir) if scratch_dir is not None else None
+        no_style_arr = remove_style_in_strips(img, target_height, target_width, tile_width, strip_bytes)
+        del img, scratch
+    img_no_style = Image.fromarray(no_style_arr)
+    # upscale to 400px (seems to be discord css limit)
+    scale = 1
+    while target_width * scale < 400:
+        scale += 1
+    if scale > 1:
+        img_no_style = img_no_style.resize((target_width * scale, target_height * scale), Image.NEAREST)
+    img_no_style_bytes = io.BytesIO()
+    img_no_style.save(img_no_style_bytes, format='PNG')
+    return img_no_style_bytes.getvalue()
+
+
+class RenderCache:
+    """
+    Rendered no style PNGs by (source digest, tw), least recently used ones go once they take more than `max_bytes`.
+    Templates that don't need rendering are remembered as `NOT_STYLED`
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Tuple[str, int], bytes] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, int]) -> Optional[bytes]:
+        png = self.entries.get(key)
+        if png is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return png
+
+    def put(self, key: Tuple[str, int], png: bytes):
+        if key in self.entries:
+            return
+        self.entries[key] = png
+        self.size += len(png) + RENDER_CACHE_ENTRY_BYTES
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted) + RENDER_CACHE_ENTRY_BYTES
+
+
+class TemplateRenderer:
+    """
+    Renders no style templates in a pool of worker processes, so decoding and encoding big images
+    neither blocks the event loop nor fights over the GIL with it
+    """
+
+    def __init__(self, bot: 'Isabel', workers: int, max_pending: int, cache: RenderCache):
+        self.bot = bot
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache = cache
+        self.pending = 0
+        self.rejected = 0
+        self.pool = self.new_pool()
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        # forking the bot would copy its threads' locks in whatever state they're in
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver'))
+
+    async def render(self, digest: str, data: bytes, target_width: int) -> Optional[bytes]:
+        """
+        :return: the no style PNG, or None if the template isn't styled or there are too many renders already
+        """
+        png = self.cache.get((digest, target_width))
+        if png is not None:
+            return png or None  # NOT_STYLED
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            self.bot.logger.info(f"Too many pxls templates rendering, keeping the plain embed for {digest}")
+            return None
+        self.pending += 1
+        try:
+            # only the raw bytes go to the worker and only the PNG comes back
+            png = await asyncio.get_event_loop().run_in_executor(self.pool, render_no_style, data, target_width)
+        except BrokenProcessPool:
+            self.bot.logger.warning("pxls template renderer died, starting a new one")
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+            return None
+        except Exception as err:
+            # bad images or a tw that doesn't fit, either way the plain embed has to do
+            self.bot.logger.warning(f"Failed to render pxls template {digest}: {err!r}")
+            return None
+        finally:
+            self.pending -= 1
+        # not being styled depends on nothing but the template and tw, so it's cached too
+        self.cache.put((digest, target_width), NOT_STYLED if png is None else png)
+        return png
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
 
-    for y in range(target_height):
-        for x in range(target_width):
-            for j in range(tile_width):
-                for i in range(tile_width):
-                    py = y * tile_width + j
-                    px = x * tile_width + i
-                    alpha = array[py, px, 3]
-                    if alpha > 128:
-                        result[y, x] = array[py, px]
-                        result[y, x, 3] = 255
-                        break
+
+def write_file(path: str, data: bytes):
+    # write next to the target and rename so readers never see a half written file
+    temporary = f'{path}.{os.urandom(4).hex()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class TemplateCache:
+    """
+    Downloaded template images on disk, stored by content hash and looked up by URL.
+    Entries are revalidated with the upstream host on every use and served stale if it can't be reached,
+    the least recently used ones are evicted once the files take more than `max_bytes`
+    """
+
+    def __init__(self, bot: 'Isabel', session: aiohttp.ClientSession, directory: str, max_bytes: int):
+        self.bot = bot
+        self.session = session
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f'{digest}.png')
+
+    async def get(self, url: str) -> Tuple[str, bytes]:
+        """
+        :return: the digest of the template and the template itself
+        """
+        if url not in self.in_flight:
+            # the same template posted in several messages at once is only downloaded once
+            task = asyncio.create_task(self.download(url))
+            task.add_done_callback(lambda _: self.in_flight.pop(url, None))
+            self.in_flight[url] = task
+        # shield so one cancelled embed doesn't cancel the download for everyone else
+        return await asyncio.shield(self.in_flight[url])
+
+    async def download(self, url: str) -> Tuple[str, bytes]:
+        loop = asyncio.get_event_loop()
+        async with self.bot.database.cursor() as cursor:
+            await cursor.execute(
+                "SELECT digest, etag, last_modified FROM pxls_template_cache WHERE url = ?",
+                (url,)
+            )
+            row = await cursor.fetchone()
+        if row is not None and not os.path.exists(self.path(row[0])):
+            row = None  # file went missing, download it again
+        headers = {}
+        if row is not None:
+            if row[1]:
+                headers['If-None-Match'] = row[1]
+            if row[2]:
+                headers['If-Modified-Since'] = row[2]
+
+        try:
+            async with self.session.get(url, timeout=IMAGE_TIMEOUT, headers=headers) as resp:
+                if resp.status == 304 and row is not None:
+                    data = None
+                elif resp.status == 200:
+                    data = await read_capped(resp, TEMPLATE_MAX_BYTES, TEMPLATE_MAX_PIXELS)
+                    etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
                 else:
-                    continue  # inner loop was *not* broken, continue the outer loop
-                break  # inner loop was broken, break the outer loop too
+                    resp.raise_for_status()
+                    raise aiohttp.ClientError(f"Unexpected status {resp.status}")
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as err:
+            if row is None:
+                raise
+            self.bot.logger.warning(f"Serving stale template for {url}: {err!r}")
+            data = None
 
-    return result
+        if data is None:
+            await self.touch(url)
+            return row[0], await loop.run_in_executor(None, read_file, self.path(row[0]))
+
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self.path(digest)):
+            await loop.run_in_executor(None, write_file, self.path(digest), data)
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
+            await cursor.execute(
+                """
+                INSERT OR REPLACE INTO pxls_template_cache (url, digest, etag, last_modified, size, used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (url, digest, etag, last_modified, len(data), time.time())
+            )
+        if row is not None and row[0] != digest:
+            await self.remove_unused(row[0])
+        await self.evict()
+        return digest, data
+
+    async def touch(self, url: str):
+        async with database.transaction(self.bot) as db:
+            await db.execute("UPDATE pxls_template_cache SET used_at = ? WHERE url = ?", (time.time(), url))
+
+    async def remove_unused(self, digest: str) -> bool:
+        """
+        Deletes the file for `digest` unless some URL still points at it
+        :return: whether the file was deleted
+        """
+        async with self.bot.database.cursor() as cursor:
+            await cursor.execute("SELECT 1 FROM pxls_template_cache WHERE digest = ? LIMIT 1", (digest,))
+            if await cursor.fetchone() is not None:
+                return False
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path(digest))
+        return True
+
+    async def evict(self):
+        async with self.bot.database.cursor() as cursor:
+            await cursor.execute("""
+            SELECT SUM(size) FROM (SELECT DISTINCT digest, size FROM pxls_template_cache)
+            """)
+            total = (await cursor.fetchone())[0] or 0
+            if total <= self.max_bytes:
+                return
+            await cursor.execute("SELECT url, digest, size FROM pxls_template_cache ORDER BY used_at")
+            rows = await cursor.fetchall()
+        for url, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            async with database.transaction(self.bot) as db:
+                await db.execute("DELETE FROM pxls_template_cache WHERE url = ?", (url,))
+            if await self.remove_unused(digest):
+                total -= size
 
 
 class EmbedController:
-    def __init__(self, pxls_urls: Iterable[re.Match[str]], session: aiohttp.ClientSession):
+    def __init__(self, pxls_urls: Iterable[re.Match[str]], templates: TemplateCache, renderer: TemplateRenderer):
         self.urls = [match[0] for match in pxls_urls]
-        self.session = session
+        self.templates = templates
+        self.renderer = renderer
         self.message: Optional[discord.Message] = None
-        self.images: dict[str, bytes] = {}
+        self.images: dict[str, Tuple[str, bytes]] = {}  # digest and image
         self.files: dict[str, discord.File] = {}
         self.embeds: dict[str, discord.Embed] = {}  # essentially a
 
@@ -89,42 +440,26 @@ class EmbedController:
         params = urllib.parse.parse_qs(urllib.parse.urlparse(url).fragment)
         if template := params.get('template', [''])[0]:
             escaped = urllib.parse.unquote(template)
-            async with self.session.get(escaped, timeout=IMAGE_TIMEOUT) as resp:
-                if resp.status == 200:
-                    self.images[url] = await resp.read()
-                else:
-                    resp.raise_for_status()
+            self.images[url] = await self.templates.get(escaped)
 
     # noinspection PyTypeChecker
-    def remove_style_all(self):
-        for n, url in enumerate(self.urls):
-            if url in self.images:
-                params = urllib.parse.parse_qs(urllib.parse.urlparse(url).fragment)
-                title = params.get('title', [f'Template{n}'])[0]
-                safe_title = remove_illegal_characters(title)
-                tw = params.get('tw', [-1])[0]
-                if tw == -1:
-                    continue
-                target_width = int(tw)
-                img = Image.open(io.BytesIO(self.images[url])).convert('RGBA')
-                width, _ = img.size
-                if target_width == width:
-                    continue
-                tile_width = int(width / target_width)
-                target_height = int(img.height / tile_width)
-                img_arr = np.array(img)
-                no_style_arr = fast_remove_style(img_arr, target_height, target_width, tile_width)
-                img_no_style = Image.fromarray(no_style_arr)
-                # upscale to 400px (seems to be discord css limit)
-                scale = 1
-                while target_width * scale < 400:
-                    scale += 1
-                if scale > 1:
-                    img_no_style = img_no_style.resize((target_width * scale, target_height * scale), Image.NEAREST)
-                img_no_style_bytes = io.BytesIO()
-                img_no_style.save(img_no_style_bytes, format='PNG')
-                img_no_style_bytes.seek(0)
-                self.files[url] = discord.File(img_no_style_bytes, filename=f"{safe_title}.png")
+    async def remove_style_single(self, n, url):
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(url).fragment)
+        title = params.get('title', [f'Template{n}'])[0]
+        safe_title = remove_illegal_characters(title)
+        tw = params.get('tw', [-1])[0]
+        if tw == -1 or not tw.isdigit():
+            return
+        png = await self.renderer.render(*self.images[url], int(tw))
+        if png is not None:
+            self.files[url] = discord.File(io.BytesIO(png), filename=f"{safe_title}.png")
+
+    async def remove_style_all(self):
+        await asyncio.gather(*(
+            self.remove_style_single(n, url)
+            for n, url in enumerate(self.urls)
+            if url in self.images
+        ))
 
     async def send_reply_to(self, message: discord.Message):
         # send initial message
@@ -139,14 +474,16 @@ class EmbedController:
             return
         # download images
         tasks = [asyncio.create_task(self.download_single(url)) for url in self.urls]
-        await asyncio.gather(*tasks)
+        await asyncio.gather(*tasks, return_exceptions=True)
         while not all(task.done() for task in tasks):
             await asyncio.sleep(1)
         for task in tasks:
-            if exc := task.exception():
+            if isinstance(exc := task.exception(), TemplateRejected):
+                logging.warning(f"Template rejected, keeping the plain embed: {exc}")
+            elif exc:
                 logging.exception(exc)
         # remove style
-        await asyncio.get_event_loop().run_in_executor(None, self.remove_style_all)
+        await self.remove_style_all()
         # edit or send new message
         self.embed_all()
         await self.message.edit(embeds=self.get_embeds(), attachments=list(self.files.values()))
@@ -160,8 +497,11 @@ class PxlsEmbedCog(commands.Cog):
         self.session = aiohttp.ClientSession()
         # TODO: replace with auth (would require me to get unblocked from pxls.space)
         self.session.headers['User-Agent'] = 'Mozilla/5.0 (compatible; Discordbot/2.0; +https://discordapp.com)'
+        self.templates = TemplateCache(bot, self.session, TEMPLATE_CACHE_DIR, TEMPLATE_CACHE_BYTES)
+        self.renderer = TemplateRenderer(bot, RENDER_WORKERS, RENDER_MAX_PENDING, RenderCache(RENDER_CACHE_BYTES))
 
     async def cog_unload(self):
+        self.renderer.close()
         await self.session.close()
 
     @commands.Cog.listener()
@@ -170,7 +510,19 @@ class PxlsEmbedCog(commands.Cog):
             return  # ignore bots
         if message.channel not in self.channels:
             return  # ignore channels that are not set up for pxls embeds
-        await EmbedController(PXLS_REGEX.finditer(message.content), self.session).send_reply_to(message)
+        await EmbedController(PXLS_REGEX.finditer(message.content), self.templates, self.renderer).send_reply_to(message)
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def pxls_render_cache(self, ctx: commands.Context):
+        rendered = self.renderer.cache
+        lookups = rendered.hits + rendered.misses
+        await ctx.send(
+            f"{rendered.hits} hits, {rendered.misses} misses ({rendered.hits / (lookups or 1):.1%} hit rate), "
+            f"{len(rendered.entries)} templates using {rendered.size / 1024 / 1024:.1f}/"
+            f"{rendered.max_bytes / 1024 / 1024:.0f} MiB, "
+            f"{self.renderer.pending} rendering, {self.renderer.rejected} rejected as over capacity"
+        )
 
     @app_commands.command(description="Will start embedding pxls links in this channel", name="pxembed")
     @app_commands.checks.has_permissions(manage_guild=True)
@@ -178,8 +530,8 @@ class PxlsEmbedCog(commands.Cog):
         if interaction.channel in self.channels:
             await interaction.response.send_message("This channel is already set up for pxls embeds")
             return
-        async with self.bot.database.cursor() as cursor:
-            await cursor.execute("INSERT INTO pxls_embed_channels VALUES (?)", (interaction.channel.id,))
+        async with database.transaction(self.bot) as db:
+            await db.execute("INSERT INTO pxls_embed_channels VALUES (?)", (interaction.channel.id,))
         self.channels.append(interaction.channel)
         await interaction.response.send_message("This channel is now set up for pxls embeds")
 
@@ -189,25 +541,47 @@ class PxlsEmbedCog(commands.Cog):
         if interaction.channel not in self.channels:
             await interaction.response.send_message("This channel is not set up for pxls embeds")
             return
-        async with self.bot.database.cursor() as cursor:
-            await cursor.execute("DELETE FROM pxls_embed_channels WHERE channel_id = ?", (interaction.channel.id,))
+        async with database.transaction(self.bot) as db:
+            await db.execute("DELETE FROM pxls_embed_channels WHERE channel_id = ?", (interaction.channel.id,))
         self.channels.remove(interaction.channel)
         await interaction.response.send_message("This channel is no longer set up for pxls embeds")
 
 
+MIGRATIONS = (
+    (
+        # lookups by channel_id use the UNIQUE index
+        """
+        CREATE TABLE IF NOT EXISTS pxls_embed_channels (
+            channel_id INTEGER UNIQUE
+        )
+        """,
+    ),
+    (
+        # several URLs can point at the same file, files are named after the digest of their content
+        """
+        CREATE TABLE IF NOT EXISTS pxls_template_cache (
+            url TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            size INTEGER NOT NULL,
+            used_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS pxls_template_cache_digest ON pxls_template_cache (digest)",
+        "CREATE INDEX IF NOT EXISTS pxls_template_cache_used_at ON pxls_template_cache (used_at)",
+    ),
+)
+
+
 async def setup(bot: 'Isabel'):
     while not bot.database:
         await asyncio.sleep(0)
+    await database.migrate(bot, 'pxls_embed', MIGRATIONS)
 
     channels = []
 
-    # create channels table
     async with bot.database.cursor() as cursor:
-        await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS pxls_embed_channels (
-                    channel_id INTEGER UNIQUE
-                )
-                """)
         await cursor.execute("SELECT channel_id FROM pxls_embed_channels")
         channels.extend([bot.get_channel(i[0]) for i in await cursor.fetchall()])
 
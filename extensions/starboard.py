@@ -1,18 +1,27 @@
 import asyncio
 import contextlib
 import datetime
+import functools
+import heapq
+import json
+import logging
 import math
 import re
-from collections import OrderedDict
-from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Set, Union
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import (
+    TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Container, Dict, Hashable, Iterable, List, Literal, Optional, Tuple, Set,
+    Union
+)
 
 import aiohttp
-import aiosqlite
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
 import helper
+from extensions import database
 
 if TYPE_CHECKING:
     from main import Isabel
@@ -20,10 +29,32 @@ if TYPE_CHECKING:
 MAX_PROMOTION_SECONDS = 24 * 60 * 60
 MAX_AGE_SECONDS = 7 * 24 * 60 * 60
 STARBOARD_INTERVAL_SECONDS = 60 * 60
+EDIT_DEBOUNCE_SECONDS = 5
+STAR_GIVERS_FLUSH_SECONDS = 1
+STAR_GIVERS_FLUSH_OPS = 100
+TENOR_TTL_SECONDS = 30 * 24 * 60 * 60
+TENOR_NEGATIVE_TTL_SECONDS = 24 * 60 * 60
+TENOR_MEMORY_CACHE_SIZE = 1000
+STAR_CACHE_SIZE = 10000
+SNAPSHOT_CACHE_SIZE = 10000
+STARRED_MESSAGE_CACHE_SIZE = 1000  # starred messages kept after the client's cache dropped them
+RECONCILE_CONCURRENCY = 2  # channels walked at once, discord.py handles the rate limits within that
+RECONCILE_CURSOR_EVERY = 50  # messages between saving progress
+TIMING_SAMPLES = 10000  # kept per timed path
+RENDER_CACHE_SIZE = 1000
+STATS_DAYS_KEPT = 8  # daily rollups needed for the week leaderboards, all-time totals are kept forever
+STATS_LIMIT = 10
 MIN_STARS = 3  # set to 0 for testing  # TODO: this shouldn't be hardcoded
 REQUIREMENTS_UP_MULTIPLIER = 10 / 9
 REQUIREMENTS_DOWN_MULTIPLIER = 19 / 20
 STAR_EMOJI = '⭐'
+PREFETCH_STARS = 2  # how many stars short of the requirement a message gets rendered ahead of its promotion
+# people reacting with something other than a star to a recent message before the bot adds a star to it,
+# the default for the star_suggestion_reactions config
+STAR_SUGGESTION_REACTIONS = 10
+STAR_SUGGESTION_REACTORS = 10000  # (message, user) pairs remembered so everyone counts once per message
+STAR_SUGGESTION_SLOTS = 100  # messages tracked per guild, memory stays fixed no matter the reaction traffic
+STAR_SUGGESTED_CACHE_SIZE = 1000
 VALID_IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'webp')
 
 # idk where copilot got this regex from but it's a good one
@@ -41,6 +72,23 @@ def fake_max_promotion_snowflake():
     )
 
 
+def decay_requirement(requirement: int, decayed_at: float, now: float) -> Tuple[int, float]:
+    """
+    Applies the hourly decay for every full hour since the requirement was last decayed
+    :return: the decayed requirement and the time it counts as decayed at
+    """
+    hours = int((now - decayed_at) // 3600)
+    for _ in range(hours):
+        if requirement <= MIN_STARS:
+            break
+        requirement = max(math.floor(requirement * REQUIREMENTS_DOWN_MULTIPLIER), MIN_STARS)
+    return requirement, decayed_at + hours * 3600
+
+
+def current_day() -> int:
+    return int(time.time() // (24 * 60 * 60))
+
+
 def fake_max_age_snowflake():
     return discord.utils.time_snowflake(
         datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(seconds=MAX_AGE_SECONDS)
@@ -63,21 +111,509 @@ def star_count_color(count: int) -> discord.Color:
 
 
 class StarredMessage:
-    def __init__(self, stars=0, message=None):
-        self.stars = stars
-        self.message: Optional[discord.Message] = message
+    # this is kept for every recently starred message, so keep it small
+    # star counts are low, a linear scan of the array is cheaper than the memory a set would use
+    __slots__ = ('givers', 'days')
+
+    def __init__(self, givers: Iterable[Tuple[int, int]] = ()):
+        """
+        :param givers: (giver_id, day) pairs, day is 0 for stars given before days were recorded
+        """
+        self.givers: array = array('Q')
+        self.days: array = array('H')  # the day each star was given, next to its giver
+        for giver_id, day in givers:
+            self.add(giver_id, day)
+
+    @property
+    def stars(self) -> int:
+        return len(self.givers)
 
     def __int__(self):
         return self.stars
 
-    def increment(self):
-        self.stars += 1
+    def add(self, giver_id: int, day: int):
+        self.givers.append(giver_id)
+        self.days.append(day)
 
-    def decrement(self):
-        self.stars = max(self.stars - 1, 0)
+    def remove(self, giver_id: int) -> int:
+        """
+        :return: the day the star was given
+        """
+        index = self.givers.index(giver_id)
+        del self.givers[index]
+        return self.days.pop(index)
+
+    def __contains__(self, giver_id: int):
+        return giver_id in self.givers
 
     def __repr__(self):
-        return f"<StarredMessage stars={self.stars} message={self.message}>"
+        return f"<StarredMessage stars={self.stars}>"
+
+
+class Timings:
+    """
+    Keeps the latest durations of the starboard's hot paths
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.samples: Dict[str, deque] = {}
+        self.calls: Dict[str, int] = {}
+
+    def record(self, name: str, seconds: float):
+        self.samples.setdefault(name, deque(maxlen=self.size)).append(seconds)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        rv = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            rv[name] = {
+                'calls': self.calls[name],
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': ordered[len(ordered) // 2] * 1000,
+                'p99_ms': ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] * 1000,
+            }
+        return rv
+
+
+def timed(func):
+    """
+    Records how long each call of a cog coroutine takes in the cog's `timings`
+    """
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            self.timings.record(func.__name__, time.perf_counter() - start)
+
+    return wrapper
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (channel_id, message_id) keys ordered by message ID,
+    snowflakes are time-ordered so a sweep only has to look at the keys that actually expire
+    """
+
+    def __init__(self, keys: Iterable[Tuple[int, int]] = ()):
+        self.heap: List[Tuple[int, Tuple[int, int]]] = [(key[1], key) for key in keys]
+        heapq.heapify(self.heap)
+
+    def add(self, key: Tuple[int, int]):
+        heapq.heappush(self.heap, (key[1], key))
+
+    def pop_expired(self, cutoff: int) -> List[Tuple[int, int]]:
+        """
+        Removes and returns every key with a message ID below `cutoff`,
+        keys might have already been removed from whatever they were indexing
+        """
+        expired = []
+        while self.heap and self.heap[0][0] < cutoff:
+            expired.append(heapq.heappop(self.heap)[1])
+        return expired
+
+    def retain(self, keys: Container[Tuple[int, int]]):
+        """
+        Drops every entry whose key isn't in `keys`, including duplicates left behind by keys that were added again
+        """
+        self.heap = [(message_id, key) for message_id, key in set(self.heap) if key in keys]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class KeyedLocks:
+    """
+    One lock per key, locks are forgotten as soon as nobody holds or waits for them
+    """
+
+    def __init__(self):
+        self.locks: Dict[Hashable, asyncio.Lock] = {}
+        self.users: Dict[Hashable, int] = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.users[key] = self.users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.users[key] -= 1
+            if not self.users[key]:
+                del self.users[key]
+                del self.locks[key]
+
+    def __len__(self):
+        return len(self.locks)
+
+
+class MessageSnapshot:
+    """
+    Just the parts of a message that `StarboardCog.render_embeds` needs, a lot smaller than the message itself
+    """
+    __slots__ = (
+        'jump_url', 'content', 'author_name', 'author_avatar_url', 'attachments', 'sticker_urls',
+        'reply_name', 'reply_jump_url', 'created_at'
+    )
+
+    def __init__(self, message: discord.Message):
+        self.jump_url: str = message.jump_url
+        self.content: str = message.content
+        self.author_name: str = message.author.display_name
+        self.author_avatar_url: str = message.author.display_avatar.url
+        # (filename, url, is_spoiler)
+        self.attachments: Tuple[Tuple[str, str, bool], ...] = tuple(
+            (attachment.filename, attachment.url, attachment.is_spoiler())
+            for attachment in message.attachments
+        )
+        self.sticker_urls: Tuple[str, ...] = tuple(sticker.url for sticker in message.stickers)
+        self.reply_name: Optional[str] = None
+        self.reply_jump_url: Optional[str] = None
+        if message.reference:
+            self.reply_jump_url = message.reference.jump_url
+            if isinstance(message.reference.resolved, discord.Message):
+                self.reply_name = message.reference.resolved.author.display_name
+        self.created_at: datetime.datetime = message.created_at
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitter counter, tracks at most `slots` keys.
+    Any key seen more than total / slots times is guaranteed to be tracked,
+    and `count - error` of a tracked key never overestimates how often it was really seen
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable) -> int:
+        """
+        Counts one occurrence of `key`
+        :return: a lower bound of how many times `key` was seen since it started being tracked
+        """
+        if key not in self.counts and len(self.counts) >= self.slots:
+            # the newcomer takes over the smallest counter, which becomes its possible overestimation
+            evicted = min(self.counts, key=self.counts.__getitem__)
+            self.errors[key] = self.counts.pop(evicted)
+            del self.errors[evicted]
+            self.counts[key] = self.errors[key]
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.errors.setdefault(key, 0)
+        return self.counts[key] - self.errors[key]
+
+    def discard(self, key: Hashable):
+        self.counts.pop(key, None)
+        self.errors.pop(key, None)
+
+    def prune(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Stops tracking every key matching `predicate`
+        :return: how many keys were dropped
+        """
+        dropped = [key for key in self.counts if predicate(key)]
+        for key in dropped:
+            self.discard(key)
+        return len(dropped)
+
+    def __len__(self):
+        return len(self.counts)
+
+
+def payload_fingerprint(kwargs: Dict) -> int:
+    return hash(json.dumps(
+        [kwargs.get('content'), [embed.to_dict() for embed in kwargs.get('embeds', [])]],
+        sort_keys=True
+    ))
+
+
+class EditCoalescer:
+    """
+    Folds any number of edits to the same message within `delay` seconds into a single edit of the latest state,
+    edits that wouldn't change what was last sent are skipped entirely
+    """
+
+    def __init__(self, delay: float, logger: logging.Logger):
+        self.delay = delay
+        self.logger = logger
+        self.pending: Dict[int, Tuple[discord.PartialMessage, Callable[[], Awaitable[Dict]]]] = {}
+        self.timers: Dict[int, asyncio.Task] = {}
+        self.last_sent: OrderedDict[int, int] = OrderedDict()  # message_id -> payload_fingerprint
+        self.requested = 0
+        self.sent = 0
+
+    @property
+    def saved(self) -> int:
+        return self.requested - self.sent - len(self.pending)
+
+    def schedule(self, partial_message: discord.PartialMessage, make_kwargs: Callable[[], Awaitable[Dict]]):
+        """
+        Schedules an edit, `make_kwargs` is only called once the edit is actually sent
+        """
+        self.requested += 1
+        self.pending[partial_message.id] = (partial_message, make_kwargs)
+        if partial_message.id not in self.timers:
+            self.timers[partial_message.id] = asyncio.create_task(self._edit_later(partial_message.id))
+
+    async def _edit_later(self, message_id: int):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.timers.pop(message_id, None)
+        await self._edit(message_id)
+
+    async def _edit(self, message_id: int):
+        entry = self.pending.pop(message_id, None)
+        if entry is None:
+            return
+        partial_message, make_kwargs = entry
+        kwargs = await make_kwargs()
+        fingerprint = payload_fingerprint(kwargs)
+        if self.last_sent.get(message_id) == fingerprint:
+            return  # nothing would change
+        self.sent += 1
+        try:
+            await partial_message.edit(**kwargs)
+        except discord.HTTPException as err:
+            self.logger.warning(f"Failed to edit starboard message {message_id}: {err}")
+        else:
+            self.remember(message_id, fingerprint)
+
+    def remember(self, message_id: int, fingerprint: int):
+        """
+        Remembers what a message currently looks like, so an edit to the same thing can be skipped
+        """
+        self.last_sent[message_id] = fingerprint
+        self.last_sent.move_to_end(message_id)
+        while len(self.last_sent) > RENDER_CACHE_SIZE:
+            self.last_sent.popitem(last=False)
+
+    async def flush(self):
+        """
+        Sends all pending edits right away
+        """
+        for timer in list(self.timers.values()):
+            timer.cancel()
+        self.timers.clear()
+        for message_id in list(self.pending):
+            await self._edit(message_id)
+
+
+# upserts for the statistics rollups, in the order StarGiversWriter.flush builds their keys
+ROLLUP_QUERIES = (
+    """
+    INSERT INTO star_message_totals (channel_id, message_id, guild_id, author_id, stars) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (channel_id, message_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+    """
+    INSERT INTO star_giver_totals (guild_id, giver_id, stars) VALUES (?, ?, ?)
+    ON CONFLICT (guild_id, giver_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+    """
+    INSERT INTO star_author_totals (guild_id, author_id, stars) VALUES (?, ?, ?)
+    ON CONFLICT (guild_id, author_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+    """
+    INSERT INTO star_daily_messages (guild_id, day, channel_id, message_id, author_id, stars) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (guild_id, day, channel_id, message_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+    """
+    INSERT INTO star_daily_givers (guild_id, day, giver_id, stars) VALUES (?, ?, ?, ?)
+    ON CONFLICT (guild_id, day, giver_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+    """
+    INSERT INTO star_daily_authors (guild_id, day, author_id, stars) VALUES (?, ?, ?, ?)
+    ON CONFLICT (guild_id, day, author_id) DO UPDATE SET stars = stars + excluded.stars
+    """,
+)
+
+
+class StarGiversWriter:
+    """
+    Buffers star_givers inserts and deletes and writes each batch in one transaction,
+    at most `max_delay` seconds or `max_ops` operations after they were queued
+    """
+
+    def __init__(self, bot: 'Isabel', max_delay: float, max_ops: int):
+        self.bot = bot
+        self.max_delay = max_delay
+        self.max_ops = max_ops
+        # (is_insert, (channel_id, message_id, giver_id), (guild_id, author_id, day))
+        self.pending: List[Tuple[bool, Tuple[int, int, int], Tuple[int, int, int]]] = []
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task = asyncio.create_task(self.run())
+
+    def queue(self, is_insert: bool, message: discord.Message, giver_id: int, day: int):
+        """
+        :param day: the day the star was given, also for removals so they come off the right daily rollup,
+            0 if it was given before days were recorded
+        """
+        self.pending.append((
+            is_insert,
+            (message.channel.id, message.id, giver_id),
+            (message.guild.id, message.author.id, day)
+        ))
+        if len(self.pending) >= self.max_ops:
+            self.wakeup.set()
+
+    async def run(self):
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.max_delay)
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as err:
+                self.bot.logger.exception(err)
+
+    async def flush(self):
+        """
+        Writes everything queued so far, together with the statistics rollups, in one transaction
+        """
+        async with self.flush_lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, []
+            # consecutive operations of the same kind go out together, order between them is kept
+            batches: List[Tuple[bool, List[Tuple[int, ...]]]] = []
+            # net star changes for every rollup row touched, star, unstar and reconcile_message only queue
+            # operations that change star_givers, so every one of them counts
+            rollups: Dict[str, Dict[Tuple[int, ...], int]] = {query: {} for query in ROLLUP_QUERIES}
+            oldest_day = current_day() - STATS_DAYS_KEPT
+            for is_insert, (channel_id, message_id, giver_id), (guild_id, author_id, day) in pending:
+                row = (channel_id, message_id, giver_id, day) if is_insert else (channel_id, message_id, giver_id)
+                if batches and batches[-1][0] == is_insert:
+                    batches[-1][1].append(row)
+                else:
+                    batches.append((is_insert, [row]))
+                if not day:
+                    continue  # starred before the rollups counted anything
+                keys = [
+                    (channel_id, message_id, guild_id, author_id),
+                    (guild_id, giver_id),
+                    (guild_id, author_id),
+                ]
+                if day >= oldest_day:  # older daily rows were pruned, don't bring them back
+                    keys += [
+                        (guild_id, day, channel_id, message_id, author_id),
+                        (guild_id, day, giver_id),
+                        (guild_id, day, author_id),
+                    ]
+                for query, key in zip(ROLLUP_QUERIES, keys):
+                    rollups[query][key] = rollups[query].get(key, 0) + (1 if is_insert else -1)
+            try:
+                async with database.transaction(self.bot) as db, db.cursor() as cursor:
+                    for is_insert, rows in batches:
+                        if is_insert:
+                            await cursor.executemany(
+                                """
+                                INSERT OR IGNORE INTO star_givers (channel_id, message_id, giver_id, day)
+                                VALUES (?, ?, ?, ?)
+                                """,
+                                rows
+                            )
+                        else:
+                            await cursor.executemany(
+                                "DELETE FROM star_givers WHERE channel_id = ? AND message_id = ? AND giver_id = ?",
+                                rows
+                            )
+                    for query, deltas in rollups.items():
+                        rows = [(*key, delta) for key, delta in deltas.items() if delta]
+                        if rows:
+                            await cursor.executemany(query, rows)
+            except Exception:
+                # none of it was written, retry the operations ahead of anything queued since in the next flush
+                self.pending[:0] = pending
+                raise
+
+    async def close(self):
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        await self.flush()
+
+
+class TenorCache:
+    """
+    Resolves tenor IDs to gif URLs, remembering the results (including dead IDs) in memory and in the database
+    """
+
+    def __init__(self, bot: 'Isabel', session: aiohttp.ClientSession):
+        self.bot = bot
+        self.session = session
+        self.memory: OrderedDict[str, Tuple[Optional[str], float]] = OrderedDict()  # tenor_id -> (url, expires_at)
+        self.in_flight: Dict[str, asyncio.Task] = {}
+
+    def remember(self, tenor_id: str, url: Optional[str], expires_at: float):
+        self.memory[tenor_id] = (url, expires_at)
+        self.memory.move_to_end(tenor_id)
+        if len(self.memory) > TENOR_MEMORY_CACHE_SIZE:
+            self.memory.popitem(last=False)
+
+    async def resolve(self, tenor_id: str) -> Optional[str]:
+        """
+        :return: the gif URL, or None if the ID doesn't exist or tenor couldn't be reached
+        """
+        cached = self.memory.get(tenor_id)
+        if cached is not None and cached[1] > time.time():
+            self.memory.move_to_end(tenor_id)
+            return cached[0]
+        if tenor_id not in self.in_flight:
+            # concurrent renders of the same gif share one lookup
+            task = asyncio.create_task(self.lookup(tenor_id))
+            task.add_done_callback(lambda _: self.in_flight.pop(tenor_id, None))
+            self.in_flight[tenor_id] = task
+        # shield so a cancelled render doesn't cancel the lookup for everyone else
+        return await asyncio.shield(self.in_flight[tenor_id])
+
+    async def lookup(self, tenor_id: str) -> Optional[str]:
+        async with self.bot.database.cursor() as cursor:
+            await cursor.execute("SELECT url, expires_at FROM tenor_cache WHERE tenor_id = ?", (tenor_id,))
+            row = await cursor.fetchone()
+        if row is not None and row[1] > time.time():
+            self.remember(tenor_id, row[0], row[1])
+            return row[0]
+
+        try:
+            async with self.session.get(
+                    "https://tenor.googleapis.com/v2/posts",
+                    params={
+                        'ids': tenor_id,
+                        'key': self.bot.config['tenor_key'],
+                        'media_filter': 'gif,tinygif'
+                    }
+            ) as resp:
+                if resp.status != 200:
+                    self.bot.logger.warning(f"Tenor responded with {resp.status} for {tenor_id}")
+                    return None  # not cached, could be a temporary problem
+                data = await resp.json()
+        except aiohttp.ClientError as err:
+            self.bot.logger.warning(f"Failed to reach tenor for {tenor_id}: {err}")
+            return None
+
+        if data['results']:
+            gif_size = data['results'][0]['media_formats']['gif']['size']
+            _format = 'gif' if gif_size < 1000000 else 'tinygif'  # 1MB?
+            url = data['results'][0]['media_formats'][_format]['url']
+            expires_at = time.time() + TENOR_TTL_SECONDS
+        else:
+            url = None  # dead ID, don't ask again for a while
+            expires_at = time.time() + TENOR_NEGATIVE_TTL_SECONDS
+        self.remember(tenor_id, url, expires_at)
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
+            await cursor.execute(
+                "INSERT OR REPLACE INTO tenor_cache (tenor_id, url, expires_at) VALUES (?, ?, ?)",
+                (tenor_id, url, expires_at)
+            )
+        return url
 
 
 class SetupConfirm(discord.ui.View):
@@ -139,59 +675,133 @@ class StarboardCog(commands.Cog):
             bot: 'Isabel',
             starboards: Dict[discord.Guild, discord.TextChannel],
             requirements: Dict[discord.Guild, int],
-            starred_messages: Dict[Tuple[int, int], StarredMessage]
+            requirements_decayed_at: Dict[discord.Guild, float],
+            references: Dict[Tuple[int, int], Tuple[int, int]],
+            timings: Timings
     ):
         self.bot = bot
+        self.timings = timings
         self.starboards: Dict[discord.Guild, discord.TextChannel] = starboards
         self.current_requirements: Dict[discord.Guild, int] = requirements
-        self.star_cache: Dict[Tuple[int, int], StarredMessage] = starred_messages
-        self.known_dirty_messages: Set[Tuple[int, int]] = set()  # channel_id, message_id
+        # when each requirement was last decayed, decay is applied for whole hours since then
+        self.requirements_decayed_at: Dict[discord.Guild, float] = requirements_decayed_at
+        # LRU of recently starred messages and who starred them, loaded on demand by get_starred
+        self.star_cache: OrderedDict[Tuple[int, int], StarredMessage] = OrderedDict()
+        self.star_cache_expiry = ExpiryIndex()
+        # givers changed by live reactions while the message was being reconciled, those win over the reconciliation
+        self.live_changes: Dict[Tuple[int, int], Set[int]] = {}
+        # everything below this snowflake has already been deleted from the database
+        self.swept_snowflake = 0
+        self.star_givers_writer = StarGiversWriter(bot, STAR_GIVERS_FLUSH_SECONDS, STAR_GIVERS_FLUSH_OPS)
+        # in-memory copy of starboard_reference, the database is only used for persistence
+        # (original_channel_id, original_message_id) -> (starboard_channel_id, starboard_message_id)
+        self.starboard_references: Dict[Tuple[int, int], Tuple[int, int]] = references
+        # (starboard_channel_id, starboard_message_id) -> (original_channel_id, original_message_id)
+        self.original_references: Dict[Tuple[int, int], Tuple[int, int]] = {
+            starboard: original for original, starboard in references.items()
+        }
+        self.references_expiry = ExpiryIndex(references)
         self.promoted_messages: List[int] = []
         self.session = aiohttp.ClientSession()
         self.session.headers.update({'User-Agent': helper.use().get_user_agent(bot)})
-        self.tenor_cache: OrderedDict[str, str] = OrderedDict()
-        self.promotion_lock = asyncio.Lock()
+        self.tenor_cache = TenorCache(bot, self.session)
+        # count independent part of the starboard embeds, see make_starboard_message_kwargs
+        self.rendered_embeds: OrderedDict[Tuple[int, int], List[Dict]] = OrderedDict()
+        # serializes star changes per message, one slow message (or guild) doesn't stall the others
+        self.message_locks = KeyedLocks()
+        # messages close to promotion being refreshed and rendered ahead of time, so promoting them is just a send
+        self.prefetches: Dict[Tuple[int, int], asyncio.Task] = {}
+        # per guild counters of non-star reactions, to suggest starring messages people clearly like
+        self.reaction_hitters: Dict[int, SpaceSaving] = {}
+        self.star_suggested: OrderedDict[Tuple[int, int], None] = OrderedDict()
+        # (channel_id, message_id, user_id) already counted, least recently seen are forgotten first
+        self.suggestion_reactors: OrderedDict[Tuple[int, int, int], None] = OrderedDict()
+        self.edit_coalescer = EditCoalescer(EDIT_DEBOUNCE_SECONDS, bot.logger)
+        # mirrors the client's message cache plus messages we had to fetch, keyed by (channel_id, message_id)
+        # edits outside the client's cache are indexed too, so everything here is up-to-date
+        self.message_index: OrderedDict[Tuple[int, int], discord.Message] = OrderedDict()
+        # what the renderer needs from messages in guilds with a starboard, outlives the message index
+        self.snapshots: OrderedDict[Tuple[int, int], MessageSnapshot] = OrderedDict()
+        # recently starred messages, so every star on a message older than the message index doesn't fetch it again
+        # index_message keeps them up-to-date, the least recently starred are evicted first
+        self.starred_messages: OrderedDict[Tuple[int, int], discord.Message] = OrderedDict()
+        for cached in bot.cached_messages:
+            self.index_message(cached)
 
         self.hourly.start()
+        self.reconcile_task = asyncio.create_task(self.reconcile())
 
     async def cog_unload(self) -> None:
         self.hourly.cancel()
-        await self.session.close()
+        self.reconcile_task.cancel()
+        for prefetch in self.prefetches.values():
+            prefetch.cancel()
+        try:
+            # stars first, a failing edit must not cost us buffered stars
+            await self.star_givers_writer.close()
+        finally:
+            try:
+                await self.edit_coalescer.flush()
+            finally:
+                await self.session.close()
 
     @tasks.loop(hours=1, reconnect=True)
     async def hourly(self):
         # noinspection PyProtectedMember
         while self.bot.database is None or self.bot.database._running is False:
             await asyncio.sleep(1)
-        self.bot.logger.info("Running hourly starboard maintenance")
+        self.bot.logger.info(
+            f"Running hourly starboard maintenance, {self.edit_coalescer.saved} starboard edits saved by debouncing"
+        )
         # even though we have a while db is None loop in extension setup
         with contextlib.suppress(asyncio.CancelledError):
             # lower requirements
+            now = time.time()
             for guild in self.current_requirements:
-                self.current_requirements[guild] = max(
-                    math.floor(self.current_requirements[guild] * REQUIREMENTS_DOWN_MULTIPLIER),
-                    MIN_STARS
+                self.current_requirements[guild], self.requirements_decayed_at[guild] = decay_requirement(
+                    self.current_requirements[guild],
+                    self.requirements_decayed_at.get(guild, now),
+                    now
                 )
+            await self.save_requirements(*self.current_requirements)
 
-            # delete old stars
-            async with self.bot.database.cursor() as cursor:
-                await cursor.execute("DELETE FROM starboard_reference WHERE original_message_id < ?",
-                                     (fake_max_age_snowflake(),))
-                await cursor.execute("DELETE FROM star_givers WHERE message_id < ?", (fake_max_age_snowflake(),))
-            for channel_id, message_id in list(self.star_cache.keys()):
-                if message_id < fake_max_age_snowflake():
-                    del self.star_cache[(channel_id, message_id)]
-            for channel_id, message_id in list(self.known_dirty_messages):
-                if message_id < fake_max_age_snowflake():
-                    self.known_dirty_messages.remove((channel_id, message_id))
-            await self.bot.database.commit()
+            # delete old stars, only the bucket that expired since the last sweep
+            sweep_start = time.perf_counter()
+            cutoff = fake_max_age_snowflake()
+            await self.star_givers_writer.flush()
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
+                await cursor.execute(
+                    "DELETE FROM starboard_reference WHERE original_message_id >= ? AND original_message_id < ?",
+                    (self.swept_snowflake, cutoff)
+                )
+                deleted_rows = cursor.rowcount
+                await cursor.execute(
+                    "DELETE FROM star_givers WHERE message_id >= ? AND message_id < ?",
+                    (self.swept_snowflake, cutoff)
+                )
+                deleted_rows += cursor.rowcount
+                await cursor.execute("DELETE FROM tenor_cache WHERE expires_at < ?", (time.time(),))
+                for table in ('star_daily_messages', 'star_daily_givers', 'star_daily_authors'):
+                    await cursor.execute(f"DELETE FROM {table} WHERE day < ?", (current_day() - STATS_DAYS_KEPT,))
+            self.swept_snowflake = cutoff
+            expired_entries = 0
+            for original in self.references_expiry.pop_expired(cutoff):
+                expired_entries += self.remove_reference(original) is not None
+            for key in self.star_cache_expiry.pop_expired(cutoff):
+                expired_entries += self.star_cache.pop(key, None) is not None
+            promotion_cutoff = fake_max_promotion_snowflake()
+            for hitters in self.reaction_hitters.values():
+                expired_entries += hitters.prune(lambda key: key[1] < promotion_cutoff)
+            self.bot.logger.info(
+                f"Starboard sweep removed {deleted_rows} rows and {expired_entries} cached entries "
+                f"in {(time.perf_counter() - sweep_start) * 1000:.1f}ms"
+            )
 
+    @timed
     async def make_starboard_message_kwargs(self, message: discord.Message, stars: int) -> Dict:
         """
         Makes the kwargs for a starboard message to be used in `discord.TextChannel.send` or `discord.Message.edit`
         """
-        # TODO: what if original message has embeds?
-
         rv_content = f"{star_count_emoji(stars)} **{stars}** | {message.jump_url}"
         rv_color = star_count_color(stars)
 
@@ -202,19 +812,44 @@ class StarboardCog(commands.Cog):
             # keep track of stars but do not expose the message content in any way
             return {'content': rv_content}
 
+        # only the content, color and footer depend on the star count, everything else is rendered once per edit
+        key = (message.channel.id, message.id)
+        rendered = self.rendered_embeds.get(key)
+        if rendered is None:
+            rendered = await self.render_embeds(self.get_snapshot(message))
+            self.rendered_embeds[key] = rendered
+            while len(self.rendered_embeds) > RENDER_CACHE_SIZE:
+                self.rendered_embeds.popitem(last=False)
+        self.rendered_embeds.move_to_end(key)
+
+        all_embeds = [discord.Embed.from_dict(embed) for embed in rendered]
+        for embed in all_embeds:
+            embed.color = rv_color
+        all_embeds[-1].set_footer(text=f"Next at {self.current_requirements[message.guild]}{STAR_EMOJI}")
+
+        return {
+            'content': rv_content,
+            'embeds': all_embeds,
+            'allowed_mentions': discord.AllowedMentions.none()
+        }
+
+    async def render_embeds(self, message: MessageSnapshot) -> List[Dict]:
+        """
+        Renders the parts of the starboard embeds that don't depend on the star count
+        :return: the embeds as dicts, without color or footer
+        """
+        # TODO: what if original message has embeds?
+
         valid_extensions = tuple(f'.{ext}' for ext in VALID_IMAGE_EXTENSIONS)
-        embed = discord.Embed(
-            description=message.content,
-            color=rv_color
-        )
-        embed.set_author(name=message.author.display_name, icon_url=message.author.avatar.url)
+        embed = discord.Embed(description=message.content)
+        embed.set_author(name=message.author_name, icon_url=message.author_avatar_url)
         all_embeds = [embed]
 
         # add all valid image attachments that are not spoilers
         valid_for_image_attachments: List[str] = [
-            attachment.url
-            for attachment in message.attachments
-            if attachment.filename.lower().endswith(valid_extensions) and not attachment.is_spoiler()
+            url
+            for filename, url, is_spoiler in message.attachments
+            if filename.lower().endswith(valid_extensions) and not is_spoiler
         ]
         # add all valid image URLs that are not spoilers (whole match and group 1 are the same)
         # group 1 is the URL without the <> or || so if group 1 is different from the whole match, the URL is a spoiler
@@ -225,103 +860,122 @@ class StarboardCog(commands.Cog):
             if match[0] == match[1]
         )
         # finally add all valid stickers (there should only be one but just in case)
-        valid_for_image_attachments.extend(sticker.url for sticker in message.stickers)
+        valid_for_image_attachments.extend(message.sticker_urls)
 
         if 'tenor_key' in self.bot.config:
             for tenor in TENOR_VIEW_REGEX.finditer(message.content):
-                tenor_id = tenor[1]
-                if tenor_id in self.tenor_cache:
-                    valid_for_image_attachments.append(self.tenor_cache[tenor_id])
-                    continue
-                async with self.session.get(
-                        "https://tenor.googleapis.com/v2/posts",
-                        params={
-                            'ids': tenor_id,
-                            'key': self.bot.config['tenor_key'],
-                            'media_filter': 'gif,tinygif'
-                        }
-                ) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        if data['results']:
-                            gif_size = data['results'][0]['media_formats']['gif']['size']
-                            _format = 'gif' if gif_size < 1000000 else 'tinygif'  # 1MB?
-                            valid_for_image_attachments.append(data['results'][0]['media_formats'][_format]['url'])
-                            self.tenor_cache[tenor_id] = data['results'][0]['media_formats'][_format]['url']
-                            if len(self.tenor_cache) > 100:
-                                self.tenor_cache.popitem(last=False)
+                if tenor_url := await self.tenor_cache.resolve(tenor[1]):
+                    valid_for_image_attachments.append(tenor_url)
 
         if valid_for_image_attachments:
             embed.set_image(url=valid_for_image_attachments[0])
             all_embeds.extend(
-                discord.Embed(color=rv_color).set_image(url=attachment)
+                discord.Embed().set_image(url=attachment)
                 for attachment in valid_for_image_attachments[1:]
             )
         embed.add_field(name="Original", value=f"[Jump to message]({message.jump_url})", inline=False)
-        if message.reference:
-            res = message.reference.resolved
-            name = res.author.display_name if isinstance(res, discord.Message) else 'Jump to message'
+        if message.reply_jump_url:
             embed.add_field(
                 name="Replying to",
-                value=f"[{name}]({message.reference.jump_url})",
+                value=f"[{message.reply_name or 'Jump to message'}]({message.reply_jump_url})",
                 inline=False
             )
 
         if message.attachments:
-            for attachment in message.attachments:
-                if len(embed.fields) < 25 and attachment.url not in valid_for_image_attachments:
-                    name = attachment.filename or 'Unknown file'  # should never happen but just in case
+            for filename, url, _ in message.attachments:
+                if len(embed.fields) < 25 and url not in valid_for_image_attachments:
+                    name = filename or 'Unknown file'  # should never happen but just in case
                     embed.add_field(
                         name='Open attachment',
-                        value=f"[{name}]({attachment.url})",
+                        value=f"[{name}]({url})",
                         inline=False
                     )
 
         all_embeds = all_embeds[:10]  # max 10 embeds
-        all_embeds[-1].set_footer(text=f"Next at {self.current_requirements[message.guild]}{STAR_EMOJI}")
         all_embeds[-1].timestamp = message.created_at
 
-        return {
-            'content': rv_content,
-            'embeds': all_embeds,
-            'allowed_mentions': discord.AllowedMentions.none()
-        }
-
-    def swap_message_in_cache(self, new_message: discord.Message):
-        if (new_message.channel.id, new_message.id) in self.known_dirty_messages:
-            self.known_dirty_messages.remove((new_message.channel.id, new_message.id))
-        if (new_message.channel.id, new_message.id) in self.star_cache:
-            current_stars = self.star_cache.get((new_message.channel.id, new_message.id))
-            current_stars.message = new_message
+        return [embed.to_dict() for embed in all_embeds]
 
-    async def check_message_in_starboard(self, channel_id, message_id) -> bool:
-        async with self.bot.database.cursor() as cursor:
-            query = """
-            SELECT 1 
-            FROM starboard_reference 
-            WHERE original_channel_id = ? AND original_message_id = ?
-            """
-            await cursor.execute(query, (channel_id, message_id))
-            return bool(await cursor.fetchone())
+    def index_message(self, message: discord.Message):
+        """
+        Adds or replaces a message in the message index, evicting the oldest entries like the client's cache does
+        """
+        key = (message.channel.id, message.id)
+        self.message_index[key] = message  # replacing keeps the original position, same as the client's deque
+        # noinspection PyProtectedMember
+        max_messages = self.bot._connection.max_messages or 1000
+        while len(self.message_index) > max_messages:
+            self.message_index.popitem(last=False)
+        if key in self.starred_messages:
+            self.starred_messages[key] = message
+        if message.guild in self.starboards:
+            self.snapshot_message(message)
+
+    def snapshot_message(self, message: discord.Message) -> MessageSnapshot:
+        key = (message.channel.id, message.id)
+        snapshot = self.snapshots[key] = MessageSnapshot(message)
+        self.snapshots.move_to_end(key)
+        while len(self.snapshots) > SNAPSHOT_CACHE_SIZE:
+            self.snapshots.popitem(last=False)
+        return snapshot
+
+    def get_snapshot(self, message: discord.Message) -> MessageSnapshot:
+        key = (message.channel.id, message.id)
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            return self.snapshot_message(message)
+        self.snapshots.move_to_end(key)
+        return snapshot
+
+    def forget_message(self, channel_id, message_id):
+        self.message_index.pop((channel_id, message_id), None)
+        self.snapshots.pop((channel_id, message_id), None)
+        self.rendered_embeds.pop((channel_id, message_id), None)
+        self.starred_messages.pop((channel_id, message_id), None)
 
-    async def get_message(self, channel_id, message_id, get_clean=False, use_api=True) -> Optional[discord.Message]:
+    def swap_message_in_cache(self, new_message: discord.Message):
+        self.index_message(new_message)
+        # content might have changed, render it again next time
+        self.rendered_embeds.pop((new_message.channel.id, new_message.id), None)
+
+    def keep_starred_message(self, message: discord.Message):
+        key = (message.channel.id, message.id)
+        self.starred_messages[key] = message
+        self.starred_messages.move_to_end(key)
+        while len(self.starred_messages) > STARRED_MESSAGE_CACHE_SIZE:
+            self.starred_messages.popitem(last=False)
+
+    def check_message_in_starboard(self, channel_id, message_id) -> bool:
+        return (channel_id, message_id) in self.starboard_references
+
+    def add_reference(self, original: Tuple[int, int], starboard: Tuple[int, int]):
+        self.starboard_references[original] = starboard
+        self.original_references[starboard] = original
+        self.references_expiry.add(original)
+
+    def remove_reference(self, original: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        starboard = self.starboard_references.pop(original, None)
+        if starboard is not None:
+            self.original_references.pop(starboard, None)
+        return starboard
+
+    @timed
+    async def get_message(self, channel_id, message_id, use_api=True) -> Optional[discord.Message]:
         """
-        Gets a message from the cog's cache, the client's cache, or from the API
+        Gets a message from the cog's message index, the recently starred messages or from the API
         :param channel_id: the channel ID where the message was sent
         :param message_id: the message ID
-        :param get_clean: whether to only get messages with known up-to-date content
         :param use_api: whether to use the API to get the message if it's not in the cache
         :return: the message, or None if it doesn't exist
         """
-        if not get_clean:
-            for cached_channel_id, cached_message_id in self.star_cache:
-                cached = self.star_cache[(cached_channel_id, cached_message_id)]
-                if cached.message and cached.message.id == message_id and cached.message.channel.id == channel_id:
-                    return cached.message
-        for cached in self.bot.cached_messages:
-            if cached.id == message_id and cached.channel.id == channel_id:
-                self.swap_message_in_cache(cached)
-                return cached
+        key = (channel_id, message_id)
+        cached = self.message_index.get(key)
+        if cached is not None:
+            return cached
+        cached = self.starred_messages.get(key)
+        if cached is not None:
+            self.starred_messages.move_to_end(key)
+            return cached
         if not use_api:
             return None
         channel = self.bot.get_channel(channel_id)
@@ -331,98 +985,179 @@ class StarboardCog(commands.Cog):
                 self.swap_message_in_cache(msg)
             return msg
 
-    async def get_clean_message(self, channel_id, message_id) -> Optional[discord.Message]:
-        msg = await self.get_message(channel_id, message_id)
-        if (msg.channel.id, msg.id) in self.known_dirty_messages:
-            return await self.get_message(channel_id, message_id, get_clean=True)
-        return msg
-
-    async def check_promotion(self, message: discord.Message):
+    @timed
+    async def get_starred(self, channel_id, message_id) -> StarredMessage:
+        """
+        Gets the star givers of a message from the cog's cache, or loads them from the database
+        :param channel_id: the channel ID where the message was sent
+        :param message_id: the message ID
+        :return: the cached entry, which stays valid even if it gets evicted later
+        """
+        key = (channel_id, message_id)
+        starred = self.star_cache.get(key)
+        if starred is None:
+            if self.star_givers_writer.pending:
+                await self.star_givers_writer.flush()  # the database has to be up-to-date before we read it
+            async with self.bot.database.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT giver_id, day FROM star_givers WHERE channel_id = ? AND message_id = ?",
+                    (channel_id, message_id)
+                )
+                rows = await cursor.fetchall()
+            # someone else might have loaded it while we were waiting
+            starred = self.star_cache.get(key)
+            if starred is None:
+                starred = StarredMessage((row[0], row[1] or 0) for row in rows)
+                self.star_cache[key] = starred
+                self.star_cache_expiry.add(key)
+                while len(self.star_cache) > STAR_CACHE_SIZE:
+                    self.star_cache.popitem(last=False)
+                if len(self.star_cache_expiry) > 2 * STAR_CACHE_SIZE:
+                    # evicted keys and keys loaded more than once pile up when the LRU thrashes
+                    self.star_cache_expiry.retain(self.star_cache)
+        self.star_cache.move_to_end(key)
+        return starred
+
+    async def check_promotion(self, message: discord.Message, stars: int):
         self.bot.logger.debug(f"Checking promotion for message {message.id} in channel {message.channel.id}")
         # we arrive here only if the message is not in starboard yet
-        stars = self.star_cache[(message.channel.id, message.id)].stars
         current_requirements = self.current_requirements.setdefault(message.guild, MIN_STARS)
+        # no awaits between comparing and raising the requirement, so it's atomic for the guild
         if stars >= current_requirements:
             self.current_requirements[message.guild] = math.ceil(current_requirements * REQUIREMENTS_UP_MULTIPLIER)
-            await self.promote(await self.get_clean_message(message.channel.id, message.id), stars)
+            self.requirements_decayed_at.setdefault(message.guild, time.time())
+            await self.save_requirements(message.guild)
+            prefetch = self.prefetches.get((message.channel.id, message.id))
+            if prefetch is not None:
+                # whatever it already rendered is reused, no need to do it twice
+                await asyncio.wait([prefetch])
+            await self.promote(message, stars)
+
+    def start_prefetch(self, message: discord.Message):
+        key = (message.channel.id, message.id)
+        if key in self.prefetches or key in self.rendered_embeds:
+            return  # already prefetching, or nothing changed since it was rendered
+        prefetch = asyncio.create_task(self.prefetch(message))
+        self.prefetches[key] = prefetch
+        prefetch.add_done_callback(lambda _: self.prefetches.pop(key, None))
+
+    @timed
+    async def prefetch(self, message: discord.Message):
+        """
+        Renders a message nearing promotion ahead of time, resolving its media along the way
+        """
+        self.bot.logger.debug(f"Prefetching message {message.id} in channel {message.channel.id}")
+        try:
+            starred = await self.get_starred(message.channel.id, message.id)
+            await self.make_starboard_message_kwargs(message, starred.stars)
+        except (discord.HTTPException, aiohttp.ClientError) as err:
+            self.bot.logger.warning(f"Failed to prefetch message {message.id}: {err}")
+
+    async def save_requirements(self, *guilds: discord.Guild):
+        rows = [
+            (guild.id, self.current_requirements[guild], self.requirements_decayed_at[guild])
+            for guild in guilds
+        ]
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
+            await cursor.executemany(
+                "INSERT OR REPLACE INTO starboard_requirements (guild_id, requirement, decayed_at) VALUES (?, ?, ?)",
+                rows
+            )
 
     async def promote(self, message: discord.Message, stars: int):
         self.bot.logger.debug(f"Promoting message {message.id} in channel {message.channel.id}")
         if message.id < fake_max_promotion_snowflake():
             return  # ignore old messages
-        starred = await self.starboards[message.guild].send(**await self.make_starboard_message_kwargs(message, stars))
+        kwargs = await self.make_starboard_message_kwargs(message, stars)
+        starred = await self.starboards[message.guild].send(**kwargs)
+        self.edit_coalescer.remember(starred.id, payload_fingerprint(kwargs))
         await starred.add_reaction(STAR_EMOJI)
-        async with self.bot.database.cursor() as cursor:
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
             query = """
             INSERT INTO starboard_reference (starboard_message_id, starboard_channel_id, original_message_id, original_channel_id)
             VALUES (?, ?, ?, ?)
             """
             await cursor.execute(query, (starred.id, starred.channel.id, message.id, message.channel.id))
-        await self.bot.database.commit()
+        self.add_reference((message.channel.id, message.id), (starred.channel.id, starred.id))
 
     async def demote(self, channel_id, message_id):
-        async with self.bot.database.cursor() as cursor:
-            select_query = """
-            SELECT starboard_message_id, starboard_channel_id
-            FROM starboard_reference
-            WHERE original_message_id = ? AND original_channel_id = ?
-            """
-            await cursor.execute(select_query, (message_id, channel_id))
-            row = await cursor.fetchone()
-            if row:
-                # get the starboard message ID and channel ID to delete the message from discord
-                starboard_message_id, starboard_channel_id = row
-                starboard_channel = self.bot.get_channel(starboard_channel_id)
-                if starboard_channel is not None:
-                    starboard_message = await starboard_channel.fetch_message(starboard_message_id)
-                    if starboard_message is not None:
-                        await starboard_message.delete()
-                delete_query = """
+        await self.demote_many(channel_id, [message_id])
+
+    async def demote_many(self, channel_id, message_ids: Iterable[int]):
+        message_ids = list(message_ids)
+        demoted: List[int] = []
+        to_delete: Dict[int, List[int]] = {}  # starboard_channel_id -> starboard_message_ids
+        for message_id in message_ids:
+            starboard = self.remove_reference((channel_id, message_id))
+            if starboard is not None:
+                demoted.append(message_id)
+                to_delete.setdefault(starboard[0], []).append(starboard[1])
+        # maybe the starboard messages were deleted manually and we just need to delete the references
+        # TODO: maybe alert staff to delete the original message from the original channel
+        # or maybe delete it automatically
+        # or maybe implement a blacklist
+        deleted_manually: List[int] = []
+        for message_id in message_ids:
+            original = self.original_references.get((channel_id, message_id))
+            if original is not None:
+                self.remove_reference(original)
+                deleted_manually.append(message_id)
+        if not demoted and not deleted_manually:
+            return
+
+        for starboard_channel_id, starboard_message_ids in to_delete.items():
+            await self.delete_starboard_messages(starboard_channel_id, starboard_message_ids)
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
+            if demoted:
+                query = f"""
                 DELETE FROM starboard_reference
-                WHERE original_message_id = ? AND original_channel_id = ?
+                WHERE original_channel_id = ? AND original_message_id IN ({', '.join('?' * len(demoted))})
                 """
-                await cursor.execute(delete_query, (message_id, channel_id))
-            else:
-                # maybe the starboard message was deleted manually and we just need to delete the reference from db
-                query = """
-                DELETE FROM starboard_reference 
-                WHERE starboard_message_id = ? AND starboard_channel_id = ?
+                await cursor.execute(query, (channel_id, *demoted))
+            if deleted_manually:
+                query = f"""
+                DELETE FROM starboard_reference
+                WHERE starboard_channel_id = ? AND starboard_message_id IN ({', '.join('?' * len(deleted_manually))})
                 """
-                await cursor.execute(query, (message_id, channel_id))
-                # TODO: maybe alert staff to delete the original message from the original channel
-                # or maybe delete it automatically
-                # or maybe implement a blacklist
+                await cursor.execute(query, (channel_id, *deleted_manually))
 
+    async def delete_starboard_messages(self, channel_id, message_ids: List[int]):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        # no need to fetch the messages just to delete them
+        messages = [discord.PartialMessage(channel=channel, id=message_id) for message_id in message_ids]
+        for chunk in helper.use().chunks(messages, 100):
+            try:
+                await channel.delete_messages(chunk, reason="Original message was deleted")
+            except discord.NotFound:
+                pass  # already deleted
+            except discord.HTTPException:
+                # bulk delete needs manage_messages and refuses messages older than 14 days, go one by one instead
+                for message in chunk:
+                    with contextlib.suppress(discord.NotFound):
+                        await message.delete()
+
+    @timed
     async def star_amount_changed(self, message: discord.Message, increased: Optional[bool] = None):
         self.bot.logger.debug(
             f"Star amount changed (increased={increased}) for message {message.id} in channel {message.channel.id}"
         )
-        star_cache = self.star_cache.setdefault((message.channel.id, message.id), StarredMessage(message=message))
-        if increased is not None:
-            if increased:
-                star_cache.increment()
+        starred = await self.get_starred(message.channel.id, message.id)
+
+        async with self.message_locks.hold((message.channel.id, message.id)):
+            starboard = self.starboard_references.get((message.channel.id, message.id))
+            if starboard is not None:
+                partial_message = discord.PartialMessage(channel=self.bot.get_channel(starboard[0]), id=starboard[1])
+                self.edit_coalescer.schedule(
+                    partial_message,
+                    lambda: self.make_starboard_message_kwargs(message, starred.stars)
+                )
             else:
-                star_cache.decrement()
-
-        async with self.bot.database.cursor() as cursor:
-            async with self.promotion_lock:
-                query = """
-                SELECT starboard_message_id, starboard_channel_id
-                FROM starboard_reference
-                WHERE original_message_id = ? AND original_channel_id = ?
-                """
-                await cursor.execute(query, (message.id, message.channel.id))
-                starboard_message = await cursor.fetchone()
-                if starboard_message is not None:
-                    partial_message = discord.PartialMessage(channel=self.bot.get_channel(starboard_message[1]),
-                                                             id=starboard_message[0])
-                    kwargs = await self.make_starboard_message_kwargs(
-                        message,
-                        self.star_cache[(message.channel.id, message.id)].stars
-                    )
-                    await partial_message.edit(**kwargs)  # TODO: debounce this
-                else:
-                    await self.check_promotion(message)
+                requirement = self.current_requirements.get(message.guild, MIN_STARS)
+                if requirement - PREFETCH_STARS <= starred.stars < requirement:
+                    self.start_prefetch(message)
+                await self.check_promotion(message, starred.stars)
 
     async def star(self, giver: discord.Member, message: discord.Message):
         self.bot.logger.debug(f"Starred message {message.id} in channel {message.channel.id}")
@@ -434,29 +1169,137 @@ class StarboardCog(commands.Cog):
             return  # ignore old messages
         if giver.guild not in self.starboards:
             return  # ignore messages from guilds without starboard
-        stars_increased = True
-        try:
-            async with self.bot.database.cursor() as cursor:
-                await cursor.execute(
-                    "INSERT INTO star_givers (channel_id, message_id, giver_id) VALUES (?, ?, ?)",
-                    (message.channel.id, message.id, giver.id)
-                )
-        except aiosqlite.IntegrityError:
-            stars_increased = False
-        if stars_increased:
-            await self.star_amount_changed(message, True)
+        starred = await self.get_starred(message.channel.id, message.id)
+        if (message.channel.id, message.id) in self.live_changes:
+            self.live_changes[(message.channel.id, message.id)].add(giver.id)
+        if giver.id in starred:
+            return  # can't give more than 1 star
+        day = current_day()
+        starred.add(giver.id, day)
+        self.star_givers_writer.queue(True, message, giver.id, day)
+        await self.star_amount_changed(message, True)
 
     async def unstar(self, giver: Union[discord.Member, discord.Object], message: discord.Message):
         self.bot.logger.debug(f"Unstarred message {message.id} in channel {message.channel.id}")
         if message.id < fake_max_age_snowflake():
             return  # ignore old messages
+        starred = await self.get_starred(message.channel.id, message.id)
+        if (message.channel.id, message.id) in self.live_changes:
+            self.live_changes[(message.channel.id, message.id)].add(giver.id)
+        if giver.id not in starred:
+            return  # never starred it in the first place
+        day = starred.remove(giver.id)
+        self.star_givers_writer.queue(False, message, giver.id, day)
+        await self.star_amount_changed(message, False)
+
+    async def reconcile(self):
+        """
+        Catches up on stars given or taken away while we weren't listening,
+        a restart in the middle of this picks up where the previous run left off
+        """
+        try:
+            async with self.bot.database.cursor() as cursor:
+                await cursor.execute("SELECT channel_id, message_id FROM starboard_reconcile_cursors")
+                cursors = dict(await cursor.fetchall())
+            channels = [
+                channel
+                for guild, starboard_channel in self.starboards.items()
+                for channel in guild.text_channels
+                if channel != starboard_channel and channel.permissions_for(guild.me).read_message_history
+            ]
+            self.bot.logger.info(f"Reconciling stars in {len(channels)} channels")
+            semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+
+            async def limited(_channel: discord.TextChannel):
+                async with semaphore:
+                    await self.reconcile_channel(_channel, max(cursors.get(_channel.id, 0), fake_max_age_snowflake()))
+
+            await asyncio.gather(*(limited(channel) for channel in channels))
+            async with database.transaction(self.bot) as db:
+                await db.execute("DELETE FROM starboard_reconcile_cursors")
+            self.bot.logger.info("Finished reconciling stars")
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            self.bot.logger.exception(err)
+
+    async def reconcile_channel(self, channel: discord.TextChannel, after: int):
+        await self.star_givers_writer.flush()
         async with self.bot.database.cursor() as cursor:
             await cursor.execute(
-                "DELETE FROM star_givers WHERE channel_id = ? AND message_id = ? AND giver_id = ?",
-                (message.channel.id, message.id, giver.id)
+                "SELECT DISTINCT message_id FROM star_givers WHERE channel_id = ? AND message_id > ?",
+                (channel.id, after)
+            )
+            recorded = {row[0] for row in await cursor.fetchall()}
+        seen = 0
+        try:
+            async for message in channel.history(limit=None, after=discord.Object(id=after), oldest_first=True):
+                reaction = discord.utils.get(message.reactions, emoji=STAR_EMOJI)
+                starboard = self.starboard_references.get((channel.id, message.id))
+                if reaction is not None or starboard is not None or message.id in recorded:
+                    await self.reconcile_message(message, reaction, starboard)
+                seen += 1
+                if seen % RECONCILE_CURSOR_EVERY == 0:
+                    await self.save_reconcile_cursor(channel.id, message.id)
+        except discord.HTTPException as err:
+            self.bot.logger.warning(f"Failed to reconcile stars in {channel.id}: {err}")
+            return
+        if seen:
+            await self.save_reconcile_cursor(channel.id, message.id)
+
+    async def reconcile_message(
+            self,
+            message: discord.Message,
+            reaction: Optional[discord.Reaction],
+            starboard: Optional[Tuple[int, int]]
+    ):
+        key = (message.channel.id, message.id)
+        self.live_changes[key] = set()
+        try:
+            actual: Set[int] = set()
+            reactions = [reaction] if reaction is not None else []
+            if starboard is not None:
+                # stars on the starboard message count towards the original
+                starboard_channel = self.bot.get_channel(starboard[0])
+                if starboard_channel is not None:
+                    with contextlib.suppress(discord.NotFound):
+                        starboard_message = await starboard_channel.fetch_message(starboard[1])
+                        starboard_reaction = discord.utils.get(starboard_message.reactions, emoji=STAR_EMOJI)
+                        if starboard_reaction is not None:
+                            reactions.append(starboard_reaction)
+            for star_reaction in reactions:
+                async for user in star_reaction.users():
+                    if not user.bot:
+                        actual.add(user.id)
+            actual.discard(message.author.id)  # can't star own message
+            starred = await self.get_starred(*key)
+        finally:
+            live = self.live_changes.pop(key)
+        # no awaits from here until the givers are updated
+        recorded = set(starred.givers)
+        missing = actual - recorded - live
+        extra = recorded - actual - live
+        today = current_day()
+        for giver_id in missing:
+            starred.add(giver_id, today)
+            self.star_givers_writer.queue(True, message, giver_id, today)
+        for giver_id in extra:
+            day = starred.remove(giver_id)
+            self.star_givers_writer.queue(False, message, giver_id, day)
+        if missing or extra:
+            self.bot.logger.debug(f"Reconciled message {message.id} in channel {message.channel.id}: "
+                                  f"+{len(missing)} -{len(extra)}")
+            self.swap_message_in_cache(message)
+            # too old to be promoted, don't let it raise the requirements either
+            if starboard is not None or message.id >= fake_max_promotion_snowflake():
+                await self.star_amount_changed(message)
+
+    async def save_reconcile_cursor(self, channel_id, message_id):
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
+            await cursor.execute(
+                "INSERT OR REPLACE INTO starboard_reconcile_cursors (channel_id, message_id) VALUES (?, ?)",
+                (channel_id, message_id)
             )
-            if cursor.rowcount == 1:
-                await self.star_amount_changed(message, False)
 
     async def choose_channel(
             self,
@@ -507,7 +1350,7 @@ You can change starboard channel or stop the starboard entirely.
         if choice is not None:
             channel, next_interaction = choice
             self.starboards[interaction.guild] = channel
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("INSERT OR IGNORE INTO starboard_channels (channel_id) VALUES (?)", (channel.id,))
             await next_interaction.response.send_message("Starboard has started")
 
@@ -515,7 +1358,7 @@ You can change starboard channel or stop the starboard entirely.
         assert interaction.guild in self.starboards
         channel = self.starboards[interaction.guild]
         del self.starboards[interaction.guild]
-        async with self.bot.database.cursor() as cursor:
+        async with database.transaction(self.bot) as db, db.cursor() as cursor:
             await cursor.execute("DELETE FROM starboard_channels WHERE channel_id = ?", (channel.id,))
         await interaction.response.send_message(content="Starboard stopped", ephemeral=True)
 
@@ -528,7 +1371,7 @@ You can change starboard channel or stop the starboard entirely.
             next_channel, next_interaction = choice
             current_channel = self.starboards[interaction.guild]
             self.starboards[interaction.guild] = next_channel
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute(
                     "UPDATE starboard_channels SET channel_id = ? WHERE channel_id = ?",
                     (next_channel.id, current_channel.id)
@@ -538,6 +1381,7 @@ You can change starboard channel or stop the starboard entirely.
                 ephemeral=True
             )
 
+    @timed
     async def on_star_reaction(self, channel_id, message_id, giver: Union[discord.Member, discord.Object],
                                increment: bool):
         if message_id < fake_max_age_snowflake():
@@ -545,28 +1389,62 @@ You can change starboard channel or stop the starboard entirely.
         for channel in self.starboards.values():
             if channel.id == channel_id:
                 # get the original message instead
-                async with self.bot.database.cursor() as cursor:
-                    query = """
-                    SELECT original_channel_id, original_message_id 
-                    FROM starboard_reference 
-                    WHERE starboard_channel_id = ? AND starboard_message_id = ?
-                    """
-                    await cursor.execute(query, (channel_id, message_id))
-                    with contextlib.suppress(TypeError):
-                        original_channel_id, original_message_id = await cursor.fetchone()
-                        await self.on_star_reaction(original_channel_id, original_message_id, giver, increment)
+                original = self.original_references.get((channel_id, message_id))
+                if original is not None:
+                    original_channel_id, original_message_id = original
+                    await self.on_star_reaction(original_channel_id, original_message_id, giver, increment)
                 return
 
         func = self.star if increment else self.unstar
         msg = await self.get_message(channel_id, message_id)
         if msg is not None:
+            if msg.guild in self.starboards:
+                self.keep_starred_message(msg)
             # noinspection PyArgumentList
             await func(giver, msg)  # argument types are correct, see comment below, PyCharm is just silly here
 
+    async def suggest_star(self, payload: discord.RawReactionActionEvent):
+        """
+        Counts the first non-star reaction of each person on a message and stars the message once enough people
+        reacted, so they know they can star it
+        """
+        guild = payload.member.guild
+        if payload.member.bot or guild not in self.starboards or self.starboards[guild].id == payload.channel_id:
+            return
+        if payload.message_id < fake_max_promotion_snowflake():
+            return  # too old to be promoted anyway
+        key = (payload.channel_id, payload.message_id)
+        if key in self.star_suggested or self.check_message_in_starboard(*key):
+            return
+        reactor = (*key, payload.user_id)
+        if reactor in self.suggestion_reactors:
+            # more reactions from the same person, or one reaction toggled, don't make the message more liked
+            self.suggestion_reactors.move_to_end(reactor)
+            return
+        self.suggestion_reactors[reactor] = None
+        while len(self.suggestion_reactors) > STAR_SUGGESTION_REACTORS:
+            self.suggestion_reactors.popitem(last=False)
+        hitters = self.reaction_hitters.setdefault(guild.id, SpaceSaving(STAR_SUGGESTION_SLOTS))
+        if hitters.add(key) < self.bot.config.get('star_suggestion_reactions', STAR_SUGGESTION_REACTIONS):
+            return
+        hitters.discard(key)
+        self.star_suggested[key] = None
+        while len(self.star_suggested) > STAR_SUGGESTED_CACHE_SIZE:
+            self.star_suggested.popitem(last=False)
+        self.bot.logger.debug(f"Suggesting a star for message {payload.message_id} in channel {payload.channel_id}")
+        channel = self.bot.get_partial_messageable(payload.channel_id, guild_id=guild.id)
+        try:
+            await channel.get_partial_message(payload.message_id).add_reaction(STAR_EMOJI)
+        except discord.HTTPException as err:
+            self.bot.logger.warning(f"Failed to suggest a star for message {payload.message_id}: {err}")
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         self.bot.logger.debug(f"Reaction added: {payload}")
-        if payload.emoji.name != STAR_EMOJI or payload.member is None:
+        if payload.member is None:
+            return
+        if payload.emoji.name != STAR_EMOJI:
+            await self.suggest_star(payload)
             return
         await self.on_star_reaction(payload.channel_id, payload.message_id, payload.member, True)
 
@@ -584,22 +1462,29 @@ You can change starboard channel or stop the starboard entirely.
     async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
         await self.demote(payload.channel_id, payload.message_id)
 
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        self.index_message(message)
+
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.forget_message(payload.channel_id, payload.message_id)
         await self.demote(payload.channel_id, payload.message_id)
 
     @commands.Cog.listener()
     async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
         for message_id in payload.message_ids:
-            await self.demote(payload.channel_id, message_id)
+            self.forget_message(payload.channel_id, message_id)
+        await self.demote_many(payload.channel_id, payload.message_ids)
 
     @commands.Cog.listener()
     async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
         if not payload.cached_message:
-            self.known_dirty_messages.add((payload.channel_id, payload.message_id))
+            # the payload carries the whole updated message, so nothing has to be fetched to stay up-to-date
+            self.swap_message_in_cache(payload.message)
             # check to see if the message is in the starboard and the content needs to be updated
-            if await self.check_message_in_starboard(payload.channel_id, payload.message_id):
-                await self.star_amount_changed(await self.get_clean_message(payload.channel_id, payload.message_id))
+            if self.check_message_in_starboard(payload.channel_id, payload.message_id):
+                await self.star_amount_changed(payload.message)
         # nothing else is done in this event because the cached message is the before variant
         # see on_message_edit where the after variant is used
 
@@ -607,17 +1492,93 @@ You can change starboard channel or stop the starboard entirely.
     async def on_message_edit(self, _, after: discord.Message):
         self.swap_message_in_cache(after)
         # same as on_raw_message_edit, but with the after variant
-        if await self.check_message_in_starboard(after.channel.id, after.id):
+        if self.check_message_in_starboard(after.channel.id, after.id):
             await self.star_amount_changed(after)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
         if channel.guild in self.starboards:
             del self.starboards[channel.guild]
-            async with self.bot.database.cursor() as cursor:
+            async with database.transaction(self.bot) as db, db.cursor() as cursor:
                 await cursor.execute("DELETE FROM starboard_channels WHERE channel_id = ?", (channel.id,))
                 await cursor.execute("DELETE FROM starboard_reference WHERE starboard_channel_id = ?", (channel.id,))
-            await self.bot.database.commit()
+            for original, starboard in list(self.starboard_references.items()):
+                if starboard[0] == channel.id:
+                    self.remove_reference(original)
+
+    async def top_stars(self, guild_id: int, board: str, period: str) -> List[Tuple[int, ...]]:
+        """
+        Reads a leaderboard from the rollup tables
+        :return: rows of (channel_id, message_id, author_id, stars) for messages, (user_id, stars) otherwise
+        """
+        await self.star_givers_writer.flush()
+        columns = {
+            'messages': 'channel_id, message_id, author_id',
+            'givers': 'giver_id',
+            'authors': 'author_id',
+        }[board]
+        async with self.bot.database.cursor() as cursor:
+            if period == 'all':
+                await cursor.execute(f"""
+                SELECT {columns}, stars
+                FROM star_{board[:-1]}_totals
+                WHERE guild_id = ? AND stars > 0
+                ORDER BY stars DESC
+                LIMIT ?
+                """, (guild_id, STATS_LIMIT))
+            else:
+                days = 1 if period == 'day' else 7
+                await cursor.execute(f"""
+                SELECT {columns}, SUM(stars) AS total
+                FROM star_daily_{board}
+                WHERE guild_id = ? AND day > ?
+                GROUP BY {columns}
+                HAVING total > 0
+                ORDER BY total DESC
+                LIMIT ?
+                """, (guild_id, current_day() - days, STATS_LIMIT))
+            return await cursor.fetchall()
+
+    @app_commands.command(description="Shows the most starred messages, star givers or starred authors")
+    @app_commands.guild_only()
+    async def stars(
+            self,
+            interaction: discord.Interaction,
+            board: Literal["messages", "givers", "authors"],
+            period: Literal["day", "week", "all"] = "week"
+    ):
+        rows = await self.top_stars(interaction.guild.id, board, period)
+        lines = []
+        for n, row in enumerate(rows, start=1):
+            if board == 'messages':
+                channel_id, message_id, author_id, stars = row
+                jump_url = f"https://discord.com/channels/{interaction.guild.id}/{channel_id}/{message_id}"
+                lines.append(f"{n}. **{stars}**{STAR_EMOJI} [message]({jump_url}) by <@{author_id}>")
+            else:
+                user_id, stars = row
+                lines.append(f"{n}. <@{user_id}> **{stars}**{STAR_EMOJI}")
+        period_name = {'day': 'today', 'week': 'this week', 'all': 'of all time'}[period]
+        embed = discord.Embed(
+            title=f"Top starred {board} {period_name}" if board != 'givers' else f"Top star givers {period_name}",
+            description='\n'.join(lines) or "No stars yet"
+        )
+        await interaction.response.send_message(embed=embed)
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def starboard_timings(self, ctx: commands.Context):
+        results = {
+            'paths': self.timings.summary(),
+            'sizes': {
+                'star_cache': len(self.star_cache),
+                'message_index': len(self.message_index),
+                'starboard_references': len(self.starboard_references),
+                'snapshots': len(self.snapshots),
+                'starred_messages': len(self.starred_messages),
+                'starboards': len(self.starboards),
+            },
+        }
+        await helper.use().send_or_post_gist(ctx, f"```json\n{json.dumps(results, indent=2)}\n```")
 
     @app_commands.command(description="Will setup starboard on this server")
     @app_commands.checks.has_permissions(manage_guild=True)
@@ -628,65 +1589,188 @@ You can change starboard channel or stop the starboard entirely.
             await self.start_starboard(interaction)
 
 
-async def setup(bot: 'Isabel'):
-    while not bot.database:
-        await asyncio.sleep(0)
-    starboards: Dict[discord.Guild, discord.TextChannel] = {}
-    requirements: Dict[discord.Guild, int] = {}
-    star_cache: Dict[Tuple[int, int], StarredMessage] = {}
-    async with bot.database.cursor() as cursor:
-        await cursor.execute("""
+MIGRATIONS = (
+    (
+        """
         CREATE TABLE IF NOT EXISTS starboard_reference (
             starboard_message_id INTEGER,
             starboard_channel_id INTEGER,
             original_message_id INTEGER,
             original_channel_id INTEGER
         )
-        """)
-        await cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS starboard_channels (
             channel_id INTEGER UNIQUE
         )
-        """)
-        await cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS star_givers (
             channel_id INTEGER,
             message_id INTEGER,
             giver_id INTEGER,
             UNIQUE (channel_id, message_id, giver_id)
         )
-        """)
+        """,
+    ),
+    (
+        # demote and hourly, the leading message ID also serves the range delete
+        """
+        CREATE INDEX IF NOT EXISTS starboard_reference_original
+        ON starboard_reference (original_message_id, original_channel_id)
+        """,
+        # demote of manually deleted starboard messages and starboard channel deletion
+        """
+        CREATE INDEX IF NOT EXISTS starboard_reference_starboard
+        ON starboard_reference (starboard_channel_id, starboard_message_id)
+        """,
+        # hourly range delete, lookups by (channel_id, message_id, giver_id) use the UNIQUE index
+        """
+        CREATE INDEX IF NOT EXISTS star_givers_message
+        ON star_givers (message_id)
+        """,
+    ),
+    (
+        # url is NULL for tenor IDs that don't exist
+        """
+        CREATE TABLE IF NOT EXISTS tenor_cache (
+            tenor_id TEXT PRIMARY KEY,
+            url TEXT,
+            expires_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS tenor_cache_expires_at
+        ON tenor_cache (expires_at)
+        """,
+    ),
+    (
+        # how far the star reconciliation got in each channel, cleared when it finishes
+        """
+        CREATE TABLE IF NOT EXISTS starboard_reconcile_cursors (
+            channel_id INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL
+        )
+        """,
+    ),
+    (
+        # statistics rollups, kept up-to-date by StarGiversWriter in the same transaction as star_givers
+        """
+        CREATE TABLE IF NOT EXISTS star_message_totals (
+            channel_id INTEGER,
+            message_id INTEGER,
+            guild_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (channel_id, message_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_message_totals_leaderboard ON star_message_totals (guild_id, stars)",
+        """
+        CREATE TABLE IF NOT EXISTS star_giver_totals (
+            guild_id INTEGER,
+            giver_id INTEGER,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, giver_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_giver_totals_leaderboard ON star_giver_totals (guild_id, stars)",
+        """
+        CREATE TABLE IF NOT EXISTS star_author_totals (
+            guild_id INTEGER,
+            author_id INTEGER,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, author_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_author_totals_leaderboard ON star_author_totals (guild_id, stars)",
+        """
+        CREATE TABLE IF NOT EXISTS star_daily_messages (
+            guild_id INTEGER,
+            day INTEGER,
+            channel_id INTEGER,
+            message_id INTEGER,
+            author_id INTEGER NOT NULL,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, day, channel_id, message_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_daily_messages_day ON star_daily_messages (day)",
+        """
+        CREATE TABLE IF NOT EXISTS star_daily_givers (
+            guild_id INTEGER,
+            day INTEGER,
+            giver_id INTEGER,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, day, giver_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_daily_givers_day ON star_daily_givers (day)",
+        """
+        CREATE TABLE IF NOT EXISTS star_daily_authors (
+            guild_id INTEGER,
+            day INTEGER,
+            author_id INTEGER,
+            stars INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, day, author_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS star_daily_authors_day ON star_daily_authors (day)",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS starboard_requirements (
+            guild_id INTEGER PRIMARY KEY,
+            requirement INTEGER NOT NULL,
+            decayed_at REAL NOT NULL
+        )
+        """,
+    ),
+    (
+        # the day a star was given, so removing it takes it off the right daily rollup
+        # NULL for stars given before this, those were never counted in the rollups
+        "ALTER TABLE star_givers ADD COLUMN day INTEGER",
+    ),
+)
+
+
+async def setup(bot: 'Isabel'):
+    while not bot.database:
+        await asyncio.sleep(0)
+    setup_start = time.perf_counter()
+    timings = Timings(TIMING_SAMPLES)
+    await database.migrate(bot, 'starboard', MIGRATIONS)
+    starboards: Dict[discord.Guild, discord.TextChannel] = {}
+    requirements: Dict[discord.Guild, int] = {}
+    requirements_decayed_at: Dict[discord.Guild, float] = {}
+    references: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    async with bot.database.cursor() as cursor:
         # get starboard channels
         await cursor.execute("SELECT * FROM starboard_channels")
         rows = await cursor.fetchall()
         for row in rows:
             channel = bot.get_channel(row[0])
             starboards[channel.guild] = channel
-        # calculate requirements for each starboard by simulation
-        # requirements should be MIN_STARS * REQUIREMENTS_UP_MULTIPLIER ^ number of starred messages * REQUIREMENTS_DOWN_MULTIPLIER ^ (hours since MAX_AGE_SECONDS)
-        fake_message_id = fake_max_age_snowflake()
-        hours_in_max_age_seconds = MAX_AGE_SECONDS / 3600
-        query = """
-        SELECT starboard_channel_id, COUNT(*) 
-        FROM starboard_reference 
-        WHERE original_message_id > ?
-        GROUP BY starboard_channel_id
-        """
-        await cursor.execute(query, (fake_message_id,))
+        # restore requirements as they were saved, the hourly task decays them for the time we were offline
+        await cursor.execute("SELECT guild_id, requirement, decayed_at FROM starboard_requirements")
         rows = await cursor.fetchall()
         for row in rows:
-            channel = bot.get_channel(row[0])
-            current_requirement = math.ceil(MIN_STARS * REQUIREMENTS_UP_MULTIPLIER ** row[1])
-            current_requirement *= math.floor(REQUIREMENTS_DOWN_MULTIPLIER ** hours_in_max_age_seconds)
-            current_requirement = max(current_requirement, MIN_STARS)
-            requirements[channel.guild] = current_requirement
-        # count star givers for each message
-        await cursor.execute("SELECT channel_id, message_id, COUNT(*) FROM star_givers GROUP BY channel_id, message_id")
+            guild = bot.get_guild(row[0])
+            if guild is None:
+                continue
+            requirements[guild] = row[1]
+            requirements_decayed_at[guild] = row[2]
+        # keep starboard references in memory so events never have to query them
+        await cursor.execute("""
+        SELECT original_channel_id, original_message_id, starboard_channel_id, starboard_message_id
+        FROM starboard_reference
+        """)
         rows = await cursor.fetchall()
         for row in rows:
-            star_cache[(row[0], row[1])] = StarredMessage(row[2])
+            references[(row[0], row[1])] = (row[2], row[3])
 
-    await bot.add_cog(StarboardCog(bot, starboards, requirements, star_cache))
+    timings.record('setup', time.perf_counter() - setup_start)
+    await bot.add_cog(StarboardCog(bot, starboards, requirements, requirements_decayed_at, references, timings))
 
 # todo:
 # [x] keep track of star givers in database (so starboard and original message stay in-sync)
@@ -700,4 +1784,4 @@ async def setup(bot: 'Isabel'):
 # [x] show jump to original message and "replying to"
 # [x] keep a message cache
 # [x] starboard sanity (see if deleted via `on_channel_removed` or whatever the event is)
-# [] add star reaction to messages that have a lot of non-star reactions (just so people know they can star it)
+# [x] add star reaction to messages that have a lot of non-star reactions (just so people know they can star it)
@@ -32,6 +32,8 @@ class Isabel(commands.Bot):
         self.config = config
 
         self.database: Optional[aiosqlite.Connection] = None
+        # held by extensions.database.transaction, the connection is shared so writes have to take turns
+        self.database_lock = asyncio.Lock()
 
         # Setup logging
         if not os.path.isdir("logs"):
@@ -80,6 +82,12 @@ class Isabel(commands.Bot):
     async def close(self):
         self.get_cog('Core').cog_unload = None
         del self.get_cog('Core').cog_unload
+        # unload in reverse so extensions can still flush to the database before it's closed
+        for extension in reversed(tuple(self.extensions)):
+            try:
+                await self.unload_extension(extension)
+            except Exception as err:
+                self.logger.exception(err)
         await super().close()
 
     async def setup_hook(self) -> None:
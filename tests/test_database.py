@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import types
+
+import aiosqlite
+import pytest
+
+from extensions import database
+
+
+async def connect():
+    bot = types.SimpleNamespace(logger=logging.getLogger(__name__), database_lock=asyncio.Lock())
+    bot.database = await aiosqlite.connect(':memory:')
+    await bot.database.execute("CREATE TABLE items (name TEXT UNIQUE)")
+    await bot.database.commit()
+    return bot
+
+
+async def names(bot):
+    async with bot.database.execute("SELECT name FROM items ORDER BY name") as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+def test_failed_transaction_only_undoes_its_own_writes():
+    async def main():
+        bot = await connect()
+        try:
+            # written outside of a transaction, like code that predates them would
+            await bot.database.execute("INSERT INTO items VALUES ('uncommitted')")
+            with pytest.raises(aiosqlite.IntegrityError):
+                async with database.transaction(bot) as db:
+                    await db.execute("INSERT INTO items VALUES ('batch')")
+                    await db.execute("INSERT INTO items VALUES ('batch')")
+            assert await names(bot) == ['uncommitted']
+            async with database.transaction(bot) as db:
+                await db.execute("INSERT INTO items VALUES ('next')")
+            assert await names(bot) == ['next', 'uncommitted']
+        finally:
+            await bot.database.close()
+
+    asyncio.run(main())
+
+
+def test_transactions_take_turns():
+    async def main():
+        bot = await connect()
+        try:
+            halfway = asyncio.Event()
+
+            async def batch():
+                async with database.transaction(bot) as db:
+                    await db.execute("INSERT INTO items VALUES ('first half')")
+                    halfway.set()
+                    await asyncio.sleep(0.01)
+                    await db.execute("INSERT INTO items VALUES ('second half')")
+                    raise RuntimeError("the batch failed")
+
+            async def other():
+                await halfway.wait()
+                # would have committed the first half of the batch if it didn't wait its turn
+                async with database.transaction(bot) as db:
+                    await db.execute("INSERT INTO items VALUES ('other')")
+
+            results = await asyncio.gather(batch(), other(), return_exceptions=True)
+            assert isinstance(results[0], RuntimeError)
+            assert await names(bot) == ['other']
+        finally:
+            await bot.database.close()
+
+    asyncio.run(main())
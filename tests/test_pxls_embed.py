@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from typing import Optional
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from extensions import pxls_embed
+
+TILE_WIDTH = 5
+STRIP_BYTES = 4 * 1024 * 1024
+DECODED_BYTES = 4000 * 4000 * 4
+OUTPUT_BYTES = (4000 // TILE_WIDTH) ** 2 * 4
+# a strip and its RGBA copy, a few copies of the small output, and room for the interpreter and allocator
+MEMORY_CEILING = 2 * STRIP_BYTES + 4 * OUTPUT_BYTES + 8 * 1024 * 1024
+
+
+@pytest.fixture(scope='module')
+def oversized_template() -> bytes:
+    # 4000x4000 RGBA is 64 MB decoded, 16 times the strip size
+    styled = np.zeros((4000, 4000, 4), dtype=np.uint8)
+    styled[2::TILE_WIDTH, 2::TILE_WIDTH] = [200, 30, 40, 255]
+    styled[:TILE_WIDTH * 3, :TILE_WIDTH * 3, 3] = 90  # tiles without an opaque sub-pixel
+    data = io.BytesIO()
+    Image.fromarray(styled).save(data, format='PNG')
+    return data.getvalue()
+
+
+@pytest.fixture(scope='module')
+def oversized_template_path(oversized_template, tmp_path_factory) -> str:
+    path = tmp_path_factory.mktemp('templates') / 'oversized.png'
+    path.write_bytes(oversized_template)
+    return str(path)
+
+
+@pytest.mark.parametrize('scratch', [True, False], ids=['scratch', 'in memory'])
+def test_strips_match_single_pass(oversized_template, tmp_path, scratch):
+    target_width = 4000 // TILE_WIDTH
+    single_pass = pxls_embed.render_no_style(oversized_template, target_width, strip_bytes=2 ** 40)
+    in_strips = pxls_embed.render_no_style(
+        oversized_template, target_width, strip_bytes=STRIP_BYTES, scratch_dir=str(tmp_path) if scratch else None
+    )
+    assert single_pass == in_strips
+
+
+# renders in a fresh process so PIL's own allocations count too, prints what it used as JSON
+RENDER_IN_SUBPROCESS = """
+import json, resource, sys
+from extensions import pxls_embed
+
+path, target_width, strip_bytes, scratch_dir, private_limit = sys.argv[1:]
+with open(path, 'rb') as f:
+    data = f.read()
+
+def private_bytes():
+    # what RLIMIT_DATA limits, private writable mappings, a shared mapping of the scratch file isn't part of it
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmData:'))
+
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+if int(private_limit):
+    resource.setrlimit(resource.RLIMIT_DATA, (private_bytes() + int(private_limit), resource.RLIM_INFINITY))
+try:
+    pxls_embed.render_no_style(data, int(target_width), int(strip_bytes), scratch_dir or None)
+except MemoryError:
+    print(json.dumps({'memory_error': True}))
+else:
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - rss_before
+    print(json.dumps({'memory_error': False, 'rss_growth': rss_growth}))
+"""
+
+
+def render_in_subprocess(path: str, scratch_dir: Optional[str], private_limit: int = 0) -> dict:
+    result = subprocess.run(
+        [
+            sys.executable, '-c', RENDER_IN_SUBPROCESS,
+            path, str(4000 // TILE_WIDTH), str(STRIP_BYTES), scratch_dir or '', str(private_limit)
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+requires_rlimit_data = pytest.mark.skipif(
+    not sys.platform.startswith('linux'), reason="RLIMIT_DATA only leaves out shared mappings on linux"
+)
+
+
+@requires_rlimit_data
+def test_scratch_render_stays_under_memory_ceiling(oversized_template_path, tmp_path):
+    assert not render_in_subprocess(oversized_template_path, str(tmp_path), MEMORY_CEILING)['memory_error']
+
+
+@requires_rlimit_data
+def test_memory_ceiling_counts_the_decoded_template(oversized_template_path):
+    # the decoded template alone is 64 MB, so the ceiling has to catch it when it's decoded into private memory
+    assert render_in_subprocess(oversized_template_path, None, MEMORY_CEILING)['memory_error']
+
+
+def test_in_memory_strips_rss(oversized_template_path):
+    # the decoded template plus the strips, never a second full size copy
+    rss_growth = render_in_subprocess(oversized_template_path, None)['rss_growth']
+    assert rss_growth <= DECODED_BYTES + MEMORY_CEILING, f"RSS grew by {rss_growth}"
+
+
+def remove_style_reference(array, target_height, target_width, tile_width):
+    # the per-pixel loop fast_remove_style replaced
+    result = np.zeros((target_height, target_width, 4), dtype=np.uint8)
+    for y in range(target_height):
+        for x in range(target_width):
+            for j in range(tile_width):
+                for i in range(tile_width):
+                    pixel = array[y * tile_width + j, x * tile_width + i]
+                    if pixel[3] > 128:
+                        result[y, x] = pixel
+                        result[y, x, 3] = 255
+                        break
+                else:
+                    continue
+                break
+    return result
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_fast_remove_style_matches_per_pixel_loop(seed):
+    rng = np.random.default_rng(seed)
+    tile_width = int(rng.integers(1, 8))
+    target_height, target_width = (int(size) for size in rng.integers(1, 30, 2))
+    # leftover rows and columns that don't make a whole tile, those are ignored
+    height = target_height * tile_width + int(rng.integers(0, tile_width))
+    width = target_width * tile_width + int(rng.integers(0, tile_width))
+    styled = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    # mostly transparent like a real style, with alpha right around the threshold too
+    styled[..., 3] = np.where(rng.random((height, width)) < 0.7, rng.integers(0, 130, (height, width)), styled[..., 3])
+    assert np.array_equal(
+        pxls_embed.fast_remove_style(styled, target_height, target_width, tile_width),
+        remove_style_reference(styled, target_height, target_width, tile_width)
+    )
+
+
+def test_png_dimensions():
+    data = io.BytesIO()
+    Image.new('RGBA', (123, 45)).save(data, format='PNG')
+    assert pxls_embed.png_dimensions(data.getvalue()[:24]) == (123, 45)
+    assert pxls_embed.png_dimensions(b'GIF89a' + bytes(18)) is None
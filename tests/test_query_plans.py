@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import types
+
+import aiosqlite
+import pytest
+
+from extensions import anti_hoist, database, mention_monitor, pxls_embed, starboard
+
+# queries that run per event or per sweep, none of them may walk a whole table
+HOT_QUERIES = [
+    # starboard
+    "SELECT giver_id, day FROM star_givers WHERE channel_id = ? AND message_id = ?",
+    "SELECT DISTINCT message_id FROM star_givers WHERE channel_id = ? AND message_id > ?",
+    "INSERT OR IGNORE INTO star_givers (channel_id, message_id, giver_id, day) VALUES (?, ?, ?, ?)",
+    "DELETE FROM star_givers WHERE channel_id = ? AND message_id = ? AND giver_id = ?",
+    "DELETE FROM star_givers WHERE message_id >= ? AND message_id < ?",
+    "DELETE FROM starboard_reference WHERE original_message_id >= ? AND original_message_id < ?",
+    "DELETE FROM starboard_reference WHERE original_channel_id = ? AND original_message_id IN (?, ?)",
+    "DELETE FROM starboard_reference WHERE starboard_channel_id = ? AND starboard_message_id IN (?, ?)",
+    "DELETE FROM starboard_reference WHERE starboard_channel_id = ?",
+    "DELETE FROM starboard_channels WHERE channel_id = ?",
+    "UPDATE starboard_channels SET channel_id = ? WHERE channel_id = ?",
+    "SELECT url, expires_at FROM tenor_cache WHERE tenor_id = ?",
+    "DELETE FROM tenor_cache WHERE expires_at < ?",
+    "DELETE FROM star_daily_messages WHERE day < ?",
+    "DELETE FROM star_daily_givers WHERE day < ?",
+    "DELETE FROM star_daily_authors WHERE day < ?",
+    *(query.replace('\n', ' ') for query in starboard.ROLLUP_QUERIES),
+    "SELECT channel_id, message_id, author_id, stars FROM star_message_totals "
+    "WHERE guild_id = ? AND stars > 0 ORDER BY stars DESC LIMIT ?",
+    "SELECT giver_id, stars FROM star_giver_totals WHERE guild_id = ? AND stars > 0 ORDER BY stars DESC LIMIT ?",
+    "SELECT author_id, stars FROM star_author_totals WHERE guild_id = ? AND stars > 0 ORDER BY stars DESC LIMIT ?",
+    "SELECT giver_id, SUM(stars) AS total FROM star_daily_givers WHERE guild_id = ? AND day > ? "
+    "GROUP BY giver_id HAVING total > 0 ORDER BY total DESC LIMIT ?",
+    # anti_hoist
+    "DELETE FROM hoist_guilds WHERE guild_id = ?",
+    # mention_monitor
+    "DELETE FROM monitor_channels WHERE channel_id = ?",
+    # pxls_embed
+    "DELETE FROM pxls_embed_channels WHERE channel_id = ?",
+    "SELECT digest, etag, last_modified FROM pxls_template_cache WHERE url = ?",
+    "UPDATE pxls_template_cache SET used_at = ? WHERE url = ?",
+    "SELECT 1 FROM pxls_template_cache WHERE digest = ? LIMIT 1",
+    "DELETE FROM pxls_template_cache WHERE url = ?",
+]
+
+
+async def query_plan(query: str):
+    bot = types.SimpleNamespace(logger=logging.getLogger(__name__), database_lock=asyncio.Lock())
+    bot.database = await aiosqlite.connect(':memory:')
+    try:
+        await bot.database.execute("CREATE TABLE schema_versions (component TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        for name, module in (
+                ('starboard', starboard),
+                ('anti_hoist', anti_hoist),
+                ('mention_monitor', mention_monitor),
+                ('pxls_embed', pxls_embed),
+        ):
+            await database.migrate(bot, name, module.MIGRATIONS)
+        async with bot.database.execute(f"EXPLAIN QUERY PLAN {query}", (1,) * query.count('?')) as cursor:
+            return [row[3] for row in await cursor.fetchall()]
+    finally:
+        await bot.database.close()
+
+
+@pytest.mark.parametrize('query', HOT_QUERIES)
+def test_hot_query_uses_an_index(query):
+    plan = asyncio.run(query_plan(query))
+    scans = [step for step in plan if step.startswith('SCAN')]
+    assert not scans, f"{query} scans: {plan}"